@@ -32,7 +32,7 @@ export async function GET(request: Request) {
 
     const results: SearchResult[] = documents.map((doc) => ({
       title: doc.title || "Untitled Resource",
-      snippet: doc.content || "No content preview available",
+      snippet: doc.content_sample || "No content preview available",
       score: 1,
       url: doc.url || "#",
       language: doc.language || "Not specified",
@@ -3,6 +3,8 @@ import dotenv from "dotenv";
 import {
   FileContent,
   FileInfo,
+  ResourceDocument,
+  ResourceUpdate,
   NotebookContent,
   TextContent,
   BinaryContent,
@@ -14,19 +16,31 @@ import {
 } from "../utils/driveService";
 import {
   deleteAllResources,
-  saveToMongoDB,
+  buildResourceDocument,
+  saveResourcesToMongoDB,
   getResourceByDriveId,
   getProcessedFileIds,
-  updateExistingResource,
+  updateResourcesInMongoDB,
+  getOrCreateEmbedding,
+  ensureIndexes,
 } from "../utils/mongoService";
+import { mapWithConcurrency } from "../utils/concurrency";
 import { CreateEmbeddingResponse, ChatCompletion } from "openai/resources";
-import { exit } from "process";
-import mammoth from "mammoth";
 
 dotenv.config();
 const EMBEDDING_MODEL = process.env.EMBEDDING_MODEL || "text-embedding-3-large";
 const REASONING_MODEL = process.env.REASONING_MODEL || "gpt-4.1-nano";
 const FOLDER_ID = process.env.GOOGLE_DRIVE_FOLDER_ID;
+// Number of new or updated resources to accumulate before writing to MongoDB
+const SAVE_BATCH_SIZE = 50;
+// Maximum number of Drive files downloaded and analyzed at the same time
+const FILE_CONCURRENCY = 8;
+// Characters of extracted text sent along with the metadata prompt
+const PROMPT_CHAR_LIMIT = 4000;
+// Characters of extracted text that are embedded; nothing past this is used
+const EMBEDDING_CHAR_LIMIT = 8192;
+// Characters of extracted text stored as the resource's content sample
+const CONTENT_SAMPLE_LENGTH = 500;
 
 const openai_client = new OpenAI({
   apiKey: process.env.OPENAI_API_KEY,
@@ -132,6 +146,8 @@ async function extractTextContent(
             : Buffer.from((content as BinaryContent).data);
 
           try {
+            // Loaded on demand since only DOCX files need it
+            const { default: mammoth } = await import("mammoth");
             const result = await mammoth.extractRawText({ buffer });
             textContent = result.value;
 
@@ -157,18 +173,29 @@ async function extractTextContent(
       case "ipynb":
         const notebookContent = content as NotebookContent;
         if (notebookContent.cells) {
+          // Collect the cell sources and join once instead of growing one
+          // string, stopping once there is more text than will ever be used
+          const parts: string[] = [];
+          let length = 0;
           for (const cell of notebookContent.cells) {
+            if (length >= EMBEDDING_CHAR_LIMIT) {
+              break;
+            }
             if (cell.cell_type === "markdown") {
-              textContent += Array.isArray(cell.source)
+              const markdown = Array.isArray(cell.source)
                 ? cell.source.join(" ")
                 : cell.source;
+              parts.push(markdown);
+              length += markdown.length;
             } else if (cell.cell_type === "code") {
               const code = Array.isArray(cell.source)
                 ? cell.source.join(" ")
                 : cell.source;
-              textContent += ` ${code}`;
+              parts.push(` ${code}`);
+              length += code.length + 1;
             }
           }
+          textContent = parts.join("");
         }
         break;
 
@@ -294,21 +321,45 @@ export async function processGoogleDriveFiles(
   );
 
   try {
-    // Pass the maxFiles parameter to listResourcesInDrive
-    const files = await listResourcesInDrive(FOLDER_ID, undefined, maxFiles);
+    // Pass the maxFiles parameter to listResourcesInDrive; the indexes the
+    // writes below rely on are created while Drive is being listed
+    const [files] = await Promise.all([
+      listResourcesInDrive(FOLDER_ID, undefined, maxFiles),
+      ensureIndexes(),
+    ]);
     console.log(`Found ${files.length} files in Google Drive folder`);
 
-    let processedFileIds: string[] = [];
+    let processedFileIds = new Set<string>();
     if (onlyNew) {
-      processedFileIds = await getProcessedFileIds();
-      console.log(`Found ${processedFileIds.length} already processed files`);
+      processedFileIds = new Set(await getProcessedFileIds());
+      console.log(`Found ${processedFileIds.size} already processed files`);
     }
 
     let successCount = 0;
     let failureCount = 0;
     let skippedCount = 0;
-
-    for (const file of files) {
+    const pendingResources: ResourceDocument[] = [];
+    const pendingUpdates: ResourceUpdate[] = [];
+
+    // Batches are written in the background, one after another, so workers
+    // keep downloading and analyzing files instead of waiting on MongoDB
+    let writeQueue: Promise<void> = Promise.resolve();
+    const queueWrite = <T>(
+      batch: T[],
+      write: (batch: T[]) => Promise<void>,
+    ) => {
+      writeQueue = writeQueue
+        .then(() => write(batch))
+        .catch((error) => {
+          console.error(`Error writing batch of ${batch.length}:`, error);
+          successCount -= batch.length;
+          failureCount += batch.length;
+        });
+    };
+
+    // Download and analyze files concurrently; each file spends most of its
+    // time waiting on Drive and OpenAI round-trips
+    await mapWithConcurrency(files, FILE_CONCURRENCY, async (file) => {
       console.log(
         `Processing ${file.name || "unnamed"} (ID: ${file.id || "unknown"})`,
       );
@@ -316,18 +367,21 @@ export async function processGoogleDriveFiles(
       if (!file.id || !file.name) {
         console.error(`Invalid file data: missing ID or name`);
         failureCount++;
-        continue;
+        return;
       }
 
-      if (onlyNew && processedFileIds.includes(file.id)) {
+      if (onlyNew && processedFileIds.has(file.id)) {
         console.log(`Skipping already processed file: ${file.name}`);
         skippedCount++;
-        continue;
+        return;
       }
 
       try {
         const content = await withRateLimitRetry(() =>
-          downloadResourcesFromDrive(file.id),
+          downloadResourcesFromDrive(file.id, {
+            name: file.name,
+            mimeType: file.mimeType,
+          }),
         );
 
         if (content === null) {
@@ -335,7 +389,7 @@ export async function processGoogleDriveFiles(
             `No content downloaded for file: ${file.name} (ID: ${file.id}). Skipping.`,
           );
           failureCount++;
-          continue;
+          return;
         }
 
         const fileType = getFileType(file.name);
@@ -359,14 +413,30 @@ export async function processGoogleDriveFiles(
           drive_id: file.id,
         };
 
-        const existingResource = await getResourceByDriveId(file.id);
+        // Only existence matters, so skip the stored content and embedding
+        const existingResource = await getResourceByDriveId(file.id, {
+          _id: 1,
+        });
 
         if (existingResource) {
-          await updateExistingResource(file.id, content, enrichedInfo);
-          console.log(`Updated existing resource: ${file.name}`);
+          pendingUpdates.push({
+            driveId: file.id,
+            content,
+            info: enrichedInfo,
+          });
+          console.log(`Queued existing resource for update: ${file.name}`);
+          if (pendingUpdates.length >= SAVE_BATCH_SIZE) {
+            queueWrite(pendingUpdates.splice(0), updateResourcesInMongoDB);
+          }
         } else {
-          await saveToMongoDB(url, content, enrichedInfo);
-          console.log(`Saved new resource: ${file.name}`);
+          const resource = buildResourceDocument(url, content, enrichedInfo);
+          if (resource) {
+            pendingResources.push(resource);
+            console.log(`Queued new resource for saving: ${file.name}`);
+          }
+          if (pendingResources.length >= SAVE_BATCH_SIZE) {
+            queueWrite(pendingResources.splice(0), saveResourcesToMongoDB);
+          }
         }
 
         successCount++;
@@ -375,14 +445,16 @@ export async function processGoogleDriveFiles(
           error instanceof Error ? error.message : String(error);
         console.error(`Error processing file ${file.name}: ${errorMessage}`);
         failureCount++;
-        continue;
       }
-    }
+    });
+
+    queueWrite(pendingResources.splice(0), saveResourcesToMongoDB);
+    queueWrite(pendingUpdates.splice(0), updateResourcesInMongoDB);
+    await writeQueue;
 
     console.log(
       `Processing complete: ${successCount} files processed successfully, ${failureCount} failed, ${skippedCount} skipped`,
     );
-    exit(0);
   } catch (error) {
     const errorMessage = error instanceof Error ? error.message : String(error);
     console.error(`Error processing Google Drive files: ${errorMessage}`);
@@ -390,15 +462,122 @@ export async function processGoogleDriveFiles(
   }
 }
 
+// Languages implied by the file type alone, so the model isn't asked for them
+const FILE_TYPE_LANGUAGES: Record<string, string> = {
+  python: "python",
+  py: "python",
+  javascript: "javascript",
+  js: "javascript",
+  typescript: "typescript",
+  ts: "typescript",
+  r: "r",
+  html: "html",
+  css: "css",
+  markdown: "markdown",
+  md: "markdown",
+  docx: "document",
+};
+
+// File types that get a CS course level and CS-specific concepts
+const PROGRAMMING_FILE_TYPES = new Set([
+  "notebook",
+  "ipynb",
+  "python",
+  "py",
+  "javascript",
+  "js",
+  "typescript",
+  "ts",
+  "r",
+]);
+
+const COURSE_LEVELS = ["CS0", "CS1", "CS2", "CS3"];
+
+/**
+ * Builds a single prompt asking for every metadata field as one JSON object
+ * @param textContent The extracted text of the file
+ * @param needsLanguage Whether the language has to be inferred from the content
+ * @param isProgramming Whether the file is a programming resource
+ * @returns The prompt text
+ */
+function buildAnalysisPrompt(
+  textContent: string,
+  needsLanguage: boolean,
+  isProgramming: boolean,
+): string {
+  const fields = [
+    `"title": The title of the content, in plain text. Do not surround in quotes.`,
+  ];
+
+  if (needsLanguage) {
+    fields.push(
+      `"language": The programming language used in this content. Only the language name. If multiple, separate with commas.`,
+    );
+  }
+
+  fields.push(
+    `"context": The real-world context or topic of this content.
+      Examples include: insurance verification, movie theatre admission, blood donor eligibility,
+      airline systems, smartphone pricing, robotics competition, fashion rating, virtual pet game,
+      vacation planning, tuition calculation, university admissions, language games, Pac-Man game,
+      mathematical concepts.
+      A brief phrase (2-5 words) that best describes the context, without any additional text or explanation.
+      If mathematical, specify the type of math (e.g., "number theory - Armstrong numbers").
+      If game-related, specify the game type (e.g., "game - Pac-Man").`,
+    `"sequence_position": Where this content would likely appear in a course sequence.
+      Consider:
+      1. Complexity of concepts (basic concepts suggest early placement)
+      2. References to previous knowledge (more references suggest later placement)
+      3. Depth of application (complex applications suggest later placement)
+      4. Presence of terms like "introduction", "final project", "capstone", etc.
+      Exactly one of:
+      - "beginning" (first 20% of a course, introduces basic concepts)
+      - "middle" (middle 60% of a course, builds on fundamentals)
+      - "end" (final 20%, integrates multiple concepts, more complex applications)`,
+    `"description": A description paragraph found in the content. If there is none, a brief summary
+      of the content, discussing the main concepts, topics, and methods covered.
+      Do not include any introduction or explanation.`,
+  );
+
+  if (isProgramming) {
+    fields.push(
+      `"course_level": The course level of this lesson. Exactly one of: CS0, CS1, CS2, CS3.
+      CS0: A course meant to introduce students to programming. This is a course that does not require any prior programming experience.
+      CS1: The first required programming course of the Computer Science major.
+      CS2: The second required programming course of the Computer Science major. This should not be a class typically taken in the same term as CS1.
+      CS3: The third required course of the Computer Science major. This should not be a class typically taken in the same term as CS2.`,
+      `"cs_concepts": The main Computer Science concepts in this content, as a comma-separated list of 3-7 key CS concepts.`,
+    );
+  } else {
+    fields.push(
+      `"cs_concepts": The main concepts or topics in this content, as a comma-separated list of 3-7 key concepts.`,
+    );
+  }
+
+  return `
+    Analyze the content below and return a JSON object with exactly these string fields:
+
+    ${fields.map((field) => `- ${field}`).join("\n\n    ")}
+
+    Content: ${textContent.substring(0, PROMPT_CHAR_LIMIT)}
+  `;
+}
+
 /**
  * Extract file information and metadata
+ * All metadata fields are requested from the model in a single call
  */
 export async function extractFileInfo(
   content: FileContent | null,
   fileType: string,
   fileName: string,
 ): Promise<FileInfo> {
-  const textContent = await extractTextContent(content, fileType);
+  // Only the start of the text is ever used, so the prompt snippet, embedding
+  // input and content sample are all cut from this one bounded prefix
+  const textContent = (await extractTextContent(content, fileType)).substring(
+    0,
+    EMBEDDING_CHAR_LIMIT,
+  );
 
   let title = "";
   let language = "";
@@ -409,297 +588,102 @@ export async function extractFileInfo(
   let csConcepts = "";
   let embedding: number[] | null = null;
 
-  try {
-    if ((!title || title.length < 3) && textContent.length > 0) {
-      const titlePrompt = `
-        Extract the title from this content. 
-        Return only the title in plain text. Do not surround in quotes.
-        Content: ${textContent.substring(0, 1000)}
-      `;
-      const response: ChatCompletion = await withRateLimitRetry(() =>
-        openai_client.chat.completions.create({
-          model: REASONING_MODEL,
-          messages: [{ role: "user", content: titlePrompt }],
-        }),
-      );
-      if (response.choices[0].message.content) {
-        title = response.choices[0].message.content.trim();
-      }
-    }
-  } catch (error) {
-    const errorMessage = error instanceof Error ? error.message : String(error);
-    console.error(`Error extracting title: ${errorMessage}`);
-    title = fileName || "Untitled Document";
-  }
-
   if (textContent.length > 0) {
-    try {
-      switch (fileType) {
-        case "python":
-        case "py":
-          language = "python";
-          break;
-        case "javascript":
-        case "js":
-          language = "javascript";
-          break;
-        case "typescript":
-        case "ts":
-          language = "typescript";
-          break;
-        case "r":
-          language = "r";
-          break;
-        case "html":
-          language = "html";
-          break;
-        case "css":
-          language = "css";
-          break;
-        case "markdown":
-        case "md":
-          language = "markdown";
-          break;
-        case "docx":
-          language = "document";
-          break;
-        default:
-          const languagePrompt = `
-            Determine the programming language used in this content.
-            Return only the language name. If multiple, separate with commas.
-            Content: ${textContent.substring(0, 4000)}
-          `;
-
-          const response: ChatCompletion = await withRateLimitRetry(() =>
-            openai_client.chat.completions.create({
-              model: REASONING_MODEL,
-              messages: [{ role: "user", content: languagePrompt }],
-            }),
-          );
-
-          if (response.choices[0].message.content) {
-            language = response.choices[0].message.content.trim().toLowerCase();
-          }
-      }
-    } catch (error) {
-      const errorMessage =
-        error instanceof Error ? error.message : String(error);
-      console.error(`Error extracting language: ${errorMessage}`);
-      language = fileType !== "unknown" ? fileType : "unknown";
-    }
-
-    try {
-      const contextPrompt = `
-        Identify the real-world context or topic of this content. 
-        Examples include: insurance verification, movie theatre admission, blood donor eligibility, 
-        airline systems, smartphone pricing, robotics competition, fashion rating, virtual pet game, 
-        vacation planning, tuition calculation, university admissions, language games, Pac-Man game, 
-        mathematical concepts.
-        
-        Return a brief phrase (2-5 words) that best describes the context. Only include the context,
-        not any additional text or explanation.
-        If mathematical, specify the type of math (e.g., "number theory - Armstrong numbers").
-        If game-related, specify the game type (e.g., "game - Pac-Man").
-        
-        Content: ${textContent.substring(0, 4000)}
-      `;
-
-      const response: ChatCompletion = await withRateLimitRetry(() =>
-        openai_client.chat.completions.create({
-          model: REASONING_MODEL,
-          messages: [{ role: "user", content: contextPrompt }],
-        }),
-      );
-      if (response.choices[0].message.content) {
-        context = response.choices[0].message.content.trim();
-      }
-    } catch (error) {
-      const errorMessage =
-        error instanceof Error ? error.message : String(error);
-      console.error(`Error extracting context: ${errorMessage}`);
+    const knownLanguage = FILE_TYPE_LANGUAGES[fileType];
+    const isProgramming = PROGRAMMING_FILE_TYPES.has(fileType);
+    if (knownLanguage) {
+      language = knownLanguage;
     }
-
-    try {
-      const sequencePrompt = `
-        Analyze this content and determine where it would likely appear in a course sequence.
-        Consider:
-        1. Complexity of concepts (basic concepts suggest early placement)
-        2. References to previous knowledge (more references suggest later placement)
-        3. Depth of application (complex applications suggest later placement)
-        4. Presence of terms like "introduction", "final project", "capstone", etc.
-        
-        Return ONLY ONE of these values, and nothing else:
-        - "beginning" (first 20% of a course, introduces basic concepts)
-        - "middle" (middle 60% of a course, builds on fundamentals)
-        - "end" (final 20%, integrates multiple concepts, more complex applications)
-        
-        Content: ${textContent.substring(0, 4000)}
-      `;
-
-      const response: ChatCompletion = await withRateLimitRetry(() =>
-        openai_client.chat.completions.create({
-          model: REASONING_MODEL,
-          messages: [{ role: "user", content: sequencePrompt }],
-        }),
-      );
-
-      if (response.choices[0].message.content) {
-        sequencePosition = response.choices[0].message.content
-          .trim()
-          .toLowerCase();
-
-        if (sequencePosition.includes("beginning")) {
-          sequencePosition = "beginning";
-        } else if (sequencePosition.includes("end")) {
-          sequencePosition = "end";
-        } else {
-          sequencePosition = "middle";
-        }
-      }
-    } catch (error) {
-      const errorMessage =
-        error instanceof Error ? error.message : String(error);
-      console.error(`Error determining sequence position: ${errorMessage}`);
-    }
-    try {
-      const descriptionPrompt = `
-        Examine the content below and look for a description paragraph. If found, return it.
-        If not, return a brief summary of the content, discussing the main concepts, topics,
-        and methods covered in the content.
-        Do not include any introduction or explanation.
-        Content: ${textContent.substring(0, 4000)}
-        `;
-      const response: ChatCompletion = await withRateLimitRetry(() =>
-        openai_client.chat.completions.create({
-          model: REASONING_MODEL,
-          messages: [{ role: "user", content: descriptionPrompt }],
-        }),
-      );
-
-      if (response.choices[0].message.content) {
-        description = response.choices[0].message.content.trim();
-      }
-    } catch (error) {
-      const errorMessage =
-        error instanceof Error ? error.message : String(error);
-      console.error(`Error extracting description: ${errorMessage}`);
+    if (!isProgramming) {
+      level = "N/A";
     }
 
-    const programmingFileTypes = [
-      "notebook",
-      "ipynb",
-      "python",
-      "py",
-      "javascript",
-      "js",
-      "typescript",
-      "ts",
-      "r",
-    ];
-    if (programmingFileTypes.includes(fileType)) {
+    // The metadata and embedding requests are independent, so run them together
+    const analyze = async () => {
       try {
-        const levelPrompt = `
-          Using the below information, determine the course level of this lesson. Only return one of: [CS0, CS1, CS2, CS3].
-
-          CS0: A course meant to introduce students to programming. This is a course that does not require any prior programming experience.
-          CS1: The first required programming course of the Computer Science major.
-          CS2: The second required programming course of the Computer Science major. This should not be a class typically taken in the same term as CS1.
-          CS3: The third required course of the Computer Science major. This should not be a class typically taken in the same term as CS2.
-          
-          Content: ${textContent.substring(0, 4000)}
-        `;
-
+        const analysisPrompt = buildAnalysisPrompt(
+          textContent,
+          !knownLanguage,
+          isProgramming,
+        );
         const response: ChatCompletion = await withRateLimitRetry(() =>
           openai_client.chat.completions.create({
             model: REASONING_MODEL,
-            messages: [{ role: "user", content: levelPrompt }],
+            messages: [{ role: "user", content: analysisPrompt }],
+            response_format: { type: "json_object" },
           }),
         );
 
-        if (response.choices[0].message.content) {
-          level = response.choices[0].message.content.trim().toUpperCase();
-          if (!["CS0", "CS1", "CS2", "CS3"].includes(level)) {
-            level = "CS1";
-          }
-        }
-      } catch (error) {
-        const errorMessage =
-          error instanceof Error ? error.message : String(error);
-        console.error(`Error determining course level: ${errorMessage}`);
-      }
-    } else {
-      level = "N/A";
-    }
+        const analysis: Record<string, unknown> = JSON.parse(
+          response.choices[0].message.content || "{}",
+        );
+        // Missing or non-string fields keep their defaults
+        const field = (key: string): string => {
+          const value = analysis[key];
+          return typeof value === "string" ? value.trim() : "";
+        };
 
-    if (programmingFileTypes.includes(fileType)) {
-      try {
-        const conceptsPrompt = `
-          Extract the main Computer Science concepts from this content.
-          Return only 3-7 key CS concepts as a comma-separated list. 
-          Do not include any introduction or explanation.
-          Content: ${textContent.substring(0, 4000)}
-        `;
+        title = field("title");
+        if (!knownLanguage && field("language")) {
+          language = field("language").toLowerCase();
+        }
+        context = field("context") || context;
+        description = field("description") || description;
+        csConcepts = field("cs_concepts");
 
-        const response: ChatCompletion = await withRateLimitRetry(() =>
-          openai_client.chat.completions.create({
-            model: REASONING_MODEL,
-            messages: [{ role: "user", content: conceptsPrompt }],
-          }),
-        );
+        const sequence = field("sequence_position").toLowerCase();
+        if (sequence.includes("beginning")) {
+          sequencePosition = "beginning";
+        } else if (sequence.includes("end")) {
+          sequencePosition = "end";
+        }
 
-        if (response.choices[0].message.content) {
-          csConcepts = response.choices[0].message.content.trim();
+        if (isProgramming) {
+          const courseLevel = field("course_level").toUpperCase();
+          if (COURSE_LEVELS.includes(courseLevel)) {
+            level = courseLevel;
+          }
         }
       } catch (error) {
         const errorMessage =
           error instanceof Error ? error.message : String(error);
-        console.error(`Error extracting CS concepts: ${errorMessage}`);
+        console.error(`Error extracting file metadata: ${errorMessage}`);
+        title = fileName || "Untitled Document";
+        if (!knownLanguage) {
+          language = fileType !== "unknown" ? fileType : "unknown";
+        }
       }
-    } else {
-      try {
-        const conceptsPrompt = `
-          Extract the main concepts or topics from this content.
-          Return only 3-7 key concepts as a comma-separated list. 
-          Do not include any introduction or explanation.
-          Content: ${textContent.substring(0, 4000)}
-        `;
+    };
 
-        const response: ChatCompletion = await withRateLimitRetry(() =>
-          openai_client.chat.completions.create({
-            model: REASONING_MODEL,
-            messages: [{ role: "user", content: conceptsPrompt }],
-          }),
-        );
-
-        if (response.choices[0].message.content) {
-          csConcepts = response.choices[0].message.content.trim();
+    const embed = async () => {
+      try {
+        if (textContent.length > 0) {
+          // Unchanged content reuses the embedding stored by a previous run
+          embedding = await getOrCreateEmbedding(
+            textContent,
+            EMBEDDING_MODEL,
+            async () => {
+              const embeddingResponse: CreateEmbeddingResponse =
+                await withRateLimitRetry(() =>
+                  openai_client.embeddings.create({
+                    input: textContent,
+                    model: EMBEDDING_MODEL,
+                  }),
+                );
+              return embeddingResponse.data[0].embedding;
+            },
+          );
+        } else {
+          console.warn("No text content available for embedding generation");
         }
       } catch (error) {
         const errorMessage =
           error instanceof Error ? error.message : String(error);
-        console.error(`Error extracting concepts: ${errorMessage}`);
+        console.error(`Error generating embedding: ${errorMessage}`);
       }
-    }
+    };
 
-    try {
-      const contentForEmbedding = textContent.substring(0, 8192);
-      if (contentForEmbedding.length > 0) {
-        const embeddingResponse: CreateEmbeddingResponse =
-          await withRateLimitRetry(() =>
-            openai_client.embeddings.create({
-              input: contentForEmbedding,
-              model: EMBEDDING_MODEL,
-            }),
-          );
-        embedding = embeddingResponse.data[0].embedding;
-      } else {
-        console.warn("No text content available for embedding generation");
-      }
-    } catch (error) {
-      const errorMessage =
-        error instanceof Error ? error.message : String(error);
-      console.error(`Error generating embedding: ${errorMessage}`);
-    }
+    await Promise.all([analyze(), embed()]);
   }
 
   return {
@@ -711,7 +695,7 @@ export async function extractFileInfo(
     description,
     sequence_position: sequencePosition,
     vector_embedding: embedding,
-    content_sample: textContent.substring(0, 500),
+    content_sample: textContent.substring(0, CONTENT_SAMPLE_LENGTH),
     file_type: fileType,
   };
 }
@@ -739,6 +723,8 @@ async function main(): Promise<void> {
     }
 
     await processGoogleDriveFiles(!processAll, maxFiles);
+    // Exit explicitly so the pooled MongoDB connection doesn't keep the script alive
+    process.exit(0);
   } catch (error) {
     const errorMessage = error instanceof Error ? error.message : String(error);
     console.error(`Error in main function: ${errorMessage}`);
@@ -746,8 +732,11 @@ async function main(): Promise<void> {
   }
 }
 
-main().catch((error) => {
-  const errorMessage = error instanceof Error ? error.message : String(error);
-  console.error(`Error in main function: ${errorMessage}`);
-  process.exit(1);
-});
+// Only run when executed directly, not when imported (e.g. by the embed API route)
+if (require.main === module) {
+  main().catch((error) => {
+    const errorMessage = error instanceof Error ? error.message : String(error);
+    console.error(`Error in main function: ${errorMessage}`);
+    process.exit(1);
+  });
+}
@@ -0,0 +1,46 @@
+import dotenv from "dotenv";
+import {
+  exportResourcesFromMongoDB,
+  exportResourcesToArchive,
+} from "../utils/mongoService";
+
+dotenv.config();
+
+/**
+ * Exports every stored resource, either as one file per resource or, with
+ * --archive, as a single gzip-compressed JSON Lines archive.
+ * --output sets the output directory or archive path
+ */
+async function main(): Promise<void> {
+  const args = process.argv.slice(2);
+  const archive = args.includes("--archive");
+
+  let output: string | undefined = undefined;
+  for (let i = 0; i < args.length; i++) {
+    if (args[i] === "--output" && i + 1 < args.length) {
+      output = args[i + 1];
+    }
+  }
+
+  try {
+    if (archive) {
+      await exportResourcesToArchive(output);
+    } else {
+      await exportResourcesFromMongoDB(output);
+    }
+    // Exit explicitly so the pooled MongoDB connection doesn't keep the script alive
+    process.exit(0);
+  } catch (error) {
+    const errorMessage = error instanceof Error ? error.message : String(error);
+    console.error(`Error exporting resources: ${errorMessage}`);
+    process.exit(1);
+  }
+}
+
+if (require.main === module) {
+  main().catch((error) => {
+    const errorMessage = error instanceof Error ? error.message : String(error);
+    console.error(`Error exporting resources: ${errorMessage}`);
+    process.exit(1);
+  });
+}
@@ -1,4 +1,6 @@
-export const resourceLinks = [
+// A set, so duplicate links are dropped once when the module loads; insertion
+// order is preserved, keeping runs reproducible
+export const resourceLinks: ReadonlySet<string> = new Set([
   "https://colab.research.google.com/drive/1hDc7mFYqFKmuHZFxBI6Wmbko0aV7gocT",
   "https://colab.research.google.com/drive/1g5R7yHZ8JZoEC8cBNPg_bmaYct-6hEty",
   "https://colab.research.google.com/drive/1yduCM27PE_hY2iR-Ty2IH8VZYDou7Y8h",
@@ -146,7 +148,6 @@ export const resourceLinks = [
   "https://colab.research.google.com/drive/1Q_-TdIPjsr3fSyHqe7FRNdocjVccU0eL",
   "https://colab.research.google.com/drive/1ciiFI3n-O_eDO0tlNb_cDWzrs95jEiW4",
   "https://colab.research.google.com/drive/12zcbPyTDc1Fx8ZrQ1w2r99A3kkHwuOjM",
-  "https://colab.research.google.com/drive/12zcbPyTDc1Fx8ZrQ1w2r99A3kkHwuOjM",
   "https://colab.research.google.com/drive/1rxWqWyu5eOhDBiyhTi-xi0cTHEL0foQp",
   "https://colab.research.google.com/drive/1vnLCh10QoQEXFZvJU_Zu8REWPia1Sif4",
   "https://colab.research.google.com/drive/1SSwUGyMXrJ9X4C_nGLKEp8Wbry6aUeZQ",
@@ -331,7 +332,6 @@ export const resourceLinks = [
   "https://github.com/ds-modules/DATA88-SP22/blob/main/Lecture8/lecture8.ipynb",
   "https://github.com/ds-modules/DATA88-SP22/blob/main/Lecture9/lecture9.ipynb",
   "https://github.com/ds-modules/ECON-101B/blob/master/Intro%20(Problem%20Set%201)/PS1.ipynb",
-  "https://github.com/ds-modules/ECON-101B/blob/master/Problem%20Set%203/flex_price.ipynb",
   "https://github.com/ds-modules/ECON-130-FA24/blob/main/Section4/Section%204%20-%20Intro%20to%20Jupyter%20and%20R%20.ipynb",
   "https://github.com/ds-modules/ECON-140-SP23-SB/blob/main/ps1/ps1.ipynb",
   "https://github.com/ds-modules/ECON-140-SP23-SB/blob/main/ps2/ps2.ipynb",
@@ -366,4 +366,4 @@ export const resourceLinks = [
   "https://github.com/ds-modules/ETHSTD-22AC-SP23/blob/main/Lecture_1.ipynb",
   "https://github.com/ds-modules/ETHSTD-22AC-SP23/blob/main/Lecture_2.ipynb",
   "https://github.com/ds-modules/ETHSTD-22AC-SP23/blob/main/Lecture_3.ipynb",
-];
+]);
@@ -1,12 +1,15 @@
 import { request } from "gaxios";
 import * as process from "process";
 import { resourceLinks } from "./resourceLinks";
-import { google } from "googleapis";
+import { google, drive_v3 } from "googleapis";
 import { Readable } from "stream";
 import * as dotenv from "dotenv";
 import { authorize, getFileType } from "@/utils/driveService";
+import { forEachWithConcurrency } from "@/utils/concurrency";
 import * as path from "path";
 import * as fs from "fs";
+import * as https from "https";
+import { createHash } from "crypto";
 
 // If modifying these scopes, delete token.json.
 dotenv.config();
@@ -15,23 +18,66 @@ const SCOPES = [
   "https://www.googleapis.com/auth/drive.readonly",
 ];
 const FOLDER_ID = process.env.GOOGLE_DRIVE_FOLDER_ID;
+// Maximum number of sockets kept open to a single download host
+const MAX_SOCKETS_PER_HOST = 20;
+
+// Shared keep-alive agent so downloads from the same host reuse TCP/TLS connections
+const httpsAgent = new https.Agent({
+  keepAlive: true,
+  maxSockets: MAX_SOCKETS_PER_HOST,
+});
+
+// Sidecar manifest recording, for each resource URL, the cache validators
+// (ETag and Last-Modified) and content digest of its last upload, so re-runs
+// can send conditional requests and skip resources that have not changed
+const MANIFEST_PATH = path.join(process.cwd(), ".resource-manifest.json");
+
+type ManifestEntry = {
+  etag?: string;
+  lastModified?: string;
+  digest?: string;
+  fileName?: string;
+  // The Drive file holding this URL's content; absent for URLs skipped as
+  // duplicates of another URL's payload
+  driveFileId?: string;
+};
+type ResourceManifest = Record<string, ManifestEntry>;
 
 type OAuth2Client = typeof google.auth.OAuth2.prototype;
 
+// Captures the Drive file ID from colab.research.google.com/drive/<ID>,
+// drive.google.com/file/d/<ID>/view and open?id=<ID> URLs alike
+const DRIVE_FILE_ID_PATTERN = /(?:[?&]id=|\/drive\/|\/d\/)([-\w]{20,})/;
+// Captures owner/repo from a github.com/<owner>/<repo>/blob/ URL prefix
+const GITHUB_BLOB_PATTERN = /^https:\/\/github\.com\/([^/]+)\/([^/]+)\/blob\//;
+
+/**
+ * Builds Drive's direct download URL for a file
+ *
+ * @param fileId the Drive file ID
+ * @returns the URL serving the raw file bytes
+ */
+function driveDownloadUrl(fileId: string): string {
+  return `https://drive.google.com/uc?export=download&id=${fileId}`;
+}
+
 // Define allowed resource source types and their configs
 interface ResourceSourceConfig {
   convertUrlFunction: (url: string) => string;
   requiresAuth: boolean;
   acceptedFileTypes: string[]; // extensions without the dot
+  maxConcurrency: number; // downloads from this source in flight at once
 }
 
 // Configuration for supported source types
 const resourceSources: Record<string, ResourceSourceConfig> = {
   "github.com": {
+    // Rewrite the blob page URL to the raw file URL in a single pass
     convertUrlFunction: (url: string) =>
-      url
-        .replace("github.com", "raw.githubusercontent.com")
-        .replace("/blob/", "/"),
+      url.replace(
+        GITHUB_BLOB_PATTERN,
+        "https://raw.githubusercontent.com/$1/$2/",
+      ),
     requiresAuth: false,
     acceptedFileTypes: [
       "ipynb",
@@ -60,16 +106,28 @@ const resourceSources: Record<string, ResourceSourceConfig> = {
       "gif",
       "svg",
     ],
+    // Raw GitHub downloads are unauthenticated; use the whole socket pool
+    maxConcurrency: MAX_SOCKETS_PER_HOST,
   },
   "colab.research.google.com": {
-    convertUrlFunction: (url: string) => url, // No conversion needed
+    convertUrlFunction: (url: string) => {
+      // Fetch the raw notebook from Drive instead of the Colab UI page
+      const match = DRIVE_FILE_ID_PATTERN.exec(url);
+      return match ? driveDownloadUrl(match[1]) : url;
+    },
     requiresAuth: true, // Requires Google authentication
     acceptedFileTypes: ["ipynb"],
+    maxConcurrency: 5,
   },
   "drive.google.com": {
-    convertUrlFunction: (url: string) => url, // No conversion needed
+    convertUrlFunction: (url: string) => {
+      // Fetch the file bytes rather than the Drive viewer page
+      const match = DRIVE_FILE_ID_PATTERN.exec(url);
+      return match ? driveDownloadUrl(match[1]) : url;
+    },
     requiresAuth: true, // Requires Google authentication
     acceptedFileTypes: ["*"], // All file types
+    maxConcurrency: 5,
   },
   "gist.github.com": {
     convertUrlFunction: (url: string) => {
@@ -90,6 +148,7 @@ const resourceSources: Record<string, ResourceSourceConfig> = {
     },
     requiresAuth: false,
     acceptedFileTypes: ["*"], // All file types
+    maxConcurrency: 5,
   },
 };
 
@@ -144,13 +203,16 @@ function getMimeType(fileName: string): string {
 function getSourceType(url: string): string | null {
   if (!url) return null;
 
-  for (const source in resourceSources) {
-    if (url.includes(source)) {
-      return source;
-    }
+  // Match on the exact host so URLs that merely mention a supported host in
+  // their path (or subdomains like gist.github.com) aren't misclassified
+  let hostname: string;
+  try {
+    hostname = new URL(url).hostname.replace(/^www\./, "");
+  } catch {
+    return null;
   }
 
-  return null;
+  return Object.hasOwn(resourceSources, hostname) ? hostname : null;
 }
 
 /**
@@ -175,12 +237,13 @@ function extractFilename(url: string): string | null {
     // Special handling for specific sources
     const sourceType = getSourceType(url);
     if (sourceType === "colab.research.google.com") {
-      const fileId = segments[segments.length - 1];
+      const match = DRIVE_FILE_ID_PATTERN.exec(url);
+      const fileId = match ? match[1] : lastSegment;
       return `colab_notebook_${fileId}.ipynb`;
     } else if (sourceType === "drive.google.com") {
       // Extract file ID from URL
-      const matches = url.match(/[-\w]{25,}/);
-      const fileId = matches ? matches[0] : "unknown";
+      const match = DRIVE_FILE_ID_PATTERN.exec(url);
+      const fileId = match ? match[1] : "unknown";
       return `drive_file_${fileId}`;
     }
   } catch (e) {
@@ -214,11 +277,71 @@ async function fileExists(filePath: string): Promise<boolean> {
 }
 
 /**
- * Determines if content is an authentication/login page
+ * Reads a stream to completion and returns its contents
+ *
+ * @param stream The stream to read
+ * @returns Promise resolving to a Buffer
  */
-function isAuthPage(content: string): boolean {
-  // Common patterns in authentication pages
-  const authPatterns = [
+async function streamToBuffer(stream: Readable): Promise<Buffer> {
+  const chunks: Buffer[] = [];
+  for await (const chunk of stream) {
+    chunks.push(Buffer.isBuffer(chunk) ? chunk : Buffer.from(chunk));
+  }
+  return Buffer.concat(chunks);
+}
+
+/**
+ * Loads the resource manifest written by a previous run
+ *
+ * @returns the manifest, or an empty manifest if none could be read
+ */
+async function loadManifest(): Promise<ResourceManifest> {
+  try {
+    const content = await fs.promises.readFile(MANIFEST_PATH, "utf8");
+    return JSON.parse(content) as ResourceManifest;
+  } catch {
+    return {};
+  }
+}
+
+/**
+ * Persists the resource manifest for the next run
+ *
+ * @param manifest the manifest to save
+ */
+async function saveManifest(manifest: ResourceManifest): Promise<void> {
+  try {
+    await fs.promises.writeFile(
+      MANIFEST_PATH,
+      JSON.stringify(manifest, null, 2),
+    );
+    console.log(`Saved resource manifest to ${MANIFEST_PATH}`);
+  } catch (error) {
+    console.error("Error saving resource manifest:", error);
+  }
+}
+
+/**
+ * Builds the conditional request headers for a previously uploaded resource
+ *
+ * @param entry the manifest entry for the resource, if any
+ * @returns If-None-Match / If-Modified-Since headers for the cached validators
+ */
+function conditionalHeaders(entry?: ManifestEntry): Record<string, string> {
+  const headers: Record<string, string> = {};
+  if (entry?.etag) {
+    headers["If-None-Match"] = entry.etag;
+  }
+  if (entry?.lastModified) {
+    headers["If-Modified-Since"] = entry.lastModified;
+  }
+  return headers;
+}
+
+// Common patterns in authentication pages, combined into one case-insensitive
+// alternation so the page is scanned once
+const AUTH_PAGE_PATTERN = new RegExp(
+  [
     "sign in",
     "sign-in",
     "login",
@@ -233,30 +356,34 @@ function isAuthPage(content: string): boolean {
     "please log in",
     "credentials",
     "ServiceLogin",
-  ];
+  ].join("|"),
+  "i",
+);
 
-  const lowerContent = content.toLowerCase();
-  return authPatterns.some((pattern) => lowerContent.includes(pattern));
+/**
+ * Determines if content is an authentication/login page
+ */
+function isAuthPage(content: string): boolean {
+  return AUTH_PAGE_PATTERN.test(content);
 }
 
 /**
  * Downloads a file from a URL and uploads it to Google Drive.
  *
  * @param url the URL to download the file from
- * @param authClient the authorized OAuth2 client to use for Google Drive API
+ * @param drive the Drive client to upload with
  * @param folderId the ID of the folder to upload to
+ * @param manifest URL -> last upload details, used to skip unchanged resources; updated after each upload
+ * @param seenDigests digests of payloads already uploaded by this or an earlier run
  * @returns {Promise<void>} a promise that resolves when the file is downloaded and uploaded to Google Drive
  */
 async function downloadFileAndUploadToDrive(
   url: string,
-  authClient?: OAuth2Client,
+  drive: drive_v3.Drive,
   folderId?: string,
+  manifest: ResourceManifest = {},
+  seenDigests: Set<string> = new Set(),
 ): Promise<void> {
-  if (!authClient) {
-    console.error("No auth client provided for Google Drive upload");
-    return;
-  }
-
   try {
     // Check if URL is from a supported source
     const sourceType = getSourceType(url);
@@ -274,46 +401,106 @@ async function downloadFileAndUploadToDrive(
     // Download the file using Gaxios
     const response = await request({
       url: downloadUrl,
-      responseType: "arraybuffer",
+      responseType: "stream",
+      agent: httpsAgent,
+      timeout: 30000,
       headers: {
+        // Ask the server to reply 304 if the resource is unchanged since the last upload
+        ...conditionalHeaders(manifest[url]),
         // Add GitHub token if available and it's a GitHub URL
         ...(process.env.GITHUB_TOKEN && sourceType.includes("github.com")
           ? { Authorization: `token ${process.env.GITHUB_TOKEN}` }
           : {}),
       },
+      validateStatus: (status) =>
+        (status >= 200 && status < 300) || status === 304,
       // Add retry configuration
       retry: true,
       retryConfig: {
         retry: 3,
         retryDelay: 100,
-        statusCodesToRetry: [[500, 599]],
+        statusCodesToRetry: [
+          [429, 429],
+          [500, 599],
+        ],
         onRetryAttempt: (err) => {
           console.log(`Retry attempt due to ${err.message}`);
         },
       },
     });
 
+    if (response.status === 304) {
+      (response.data as Readable).destroy();
+      // Keep the payload claimed so other URLs serving it stay deduplicated
+      const previousDigest = manifest[url]?.digest;
+      if (previousDigest) {
+        seenDigests.add(previousDigest);
+      }
+      console.log(`Not modified since last upload: ${url}. Skipping.`);
+      return;
+    }
+
     // Determine filename
     let fileName =
       extractFilename(url) || url.split("/").pop() || "unknown_file";
 
-    // Check if this is a HTML response (which could be an auth page)
+    // Buffer the body so the same payload fetched through different URLs can
+    // be recognised before uploading it again; resources are small documents
+    const buffer = await streamToBuffer(response.data as Readable);
+
+    // HTML responses could be an auth page rather than the resource
     const contentType = response.headers["content-type"];
-    if (contentType && contentType.includes("text/html")) {
-      const content = Buffer.from(response.data as ArrayBuffer).toString(
-        "utf8",
-      );
-      if (isAuthPage(content)) {
-        console.log(`Authentication required for ${url}. Skipping.`);
-        return;
-      }
+    if (
+      contentType &&
+      contentType.includes("text/html") &&
+      isAuthPage(buffer.toString("utf8"))
+    ) {
+      console.log(`Authentication required for ${url}. Skipping.`);
+      return;
     }
 
-    // Create a readable stream from the response
-    const fileStream = Readable.from(Buffer.from(response.data as ArrayBuffer));
+    const etag = response.headers["etag"];
+    const lastModified = response.headers["last-modified"];
+    const digest = createHash("sha1").update(buffer).digest("hex");
+
+    // Some hosts (e.g. Drive downloads) never reply 304, so also compare the
+    // payload with the one uploaded last time
+    const previous = manifest[url];
+    if (previous?.digest === digest) {
+      manifest[url] = { ...previous, etag, lastModified };
+      seenDigests.add(digest);
+      console.log(`Unchanged since last upload: ${url}. Skipping.`);
+      return;
+    }
+
+    // The digest is claimed before the upload so that concurrent workers
+    // holding the same payload don't both upload it
+    if (seenDigests.has(digest)) {
+      // Recorded so the next run can send conditional headers and skip it
+      manifest[url] = { etag, lastModified, digest, fileName };
+      console.log(
+        `Same content as an already uploaded resource: ${url}. Skipping.`,
+      );
+      return;
+    }
+    seenDigests.add(digest);
+
+    // Upload to Drive, replacing the content of the file this URL was
+    // uploaded to before rather than adding another copy next to it
+    const driveFileId = await uploadToDrive(
+      drive,
+      buffer,
+      fileName,
+      folderId,
+      previous?.driveFileId,
+    );
+    if (driveFileId === null) {
+      // Let another URL with the same content try again
+      seenDigests.delete(digest);
+      return;
+    }
 
-    // Upload to Drive
-    await uploadToDrive(authClient, fileStream, fileName, folderId);
+    manifest[url] = { etag, lastModified, digest, fileName, driveFileId };
   } catch (error) {
     console.error(`Error downloading/uploading ${url}:`, error);
   }
@@ -363,7 +550,7 @@ export async function deleteAllFilesInFolder(
 
     // Query for all files within the folder with pagination to handle large folders
     let pageToken: string | undefined;
-    let allFiles: Array<{ id?: string; name?: string }> = [];
+    const allFiles: Array<{ id?: string; name?: string }> = [];
 
     do {
       const response = await drive.files.list({
@@ -377,12 +564,10 @@ export async function deleteAllFilesInFolder(
       });
 
       const files = response.data.files || [];
-      allFiles = allFiles.concat(
-        files.map((file) => ({
-          id: file.id || "",
-          name: file.name || "",
-        })),
-      );
+      // Append in place rather than concat, which copies the whole list
+      for (const file of files) {
+        allFiles.push({ id: file.id || "", name: file.name || "" });
+      }
       pageToken = response.data.nextPageToken ?? undefined;
     } while (pageToken);
 
@@ -434,8 +619,13 @@ export async function deleteAllFilesInFolder(
 
       // Wait for the current batch to complete
       const results = await Promise.all(deletePromises);
-      successCount += results.filter((r) => r.success).length;
-      failureCount += results.filter((r) => !r.success).length;
+      for (const result of results) {
+        if (result.success) {
+          successCount++;
+        } else {
+          failureCount++;
+        }
+      }
 
       // Add a small delay between batches to avoid rate limiting
       if (i + batchSize < allFiles.length) {
@@ -464,50 +654,89 @@ interface DriveRequestBody {
   parents?: string[];
 }
 
+/**
+ * Verifies that the upload folder exists and is accessible
+ *
+ * @param drive the Drive client to use
+ * @param folderId the ID of the folder to check
+ * @returns the folder ID, or undefined if uploads should go to the root folder
+ */
+async function resolveUploadFolder(
+  drive: drive_v3.Drive,
+  folderId?: string,
+): Promise<string | undefined> {
+  if (!folderId) {
+    return undefined;
+  }
+
+  try {
+    // Check if folder exists
+    await drive.files.get({
+      fileId: folderId,
+      fields: "id,name,mimeType",
+      supportsAllDrives: true,
+    });
+    console.log(`Verified folder with ID: ${folderId}`);
+    return folderId;
+  } catch (error) {
+    const errorMessage = error instanceof Error ? error.message : String(error);
+    console.error(`Error with folder ID (${folderId}): ${errorMessage}`);
+    console.log("Uploading to root folder instead.");
+    return undefined;
+  }
+}
+
 /**
  * Uploads a file to Google Drive
  *
- * @param authClient the authorized OAuth2 client to use for Google Drive API
- * @param body the readable stream of the file content
+ * @param drive the Drive client to upload with
+ * @param content the file content; each request streams it afresh
  * @param fileName the name of the file to upload
- * @param folderId the ID of the folder to upload to
+ * @param folderId the ID of an already verified folder to upload to
+ * @param existingFileId the ID of a previously uploaded file to overwrite
+ * instead of creating a new one
+ * @returns the ID of the uploaded file, or null if the upload failed
  */
 async function uploadToDrive(
-  authClient: OAuth2Client,
-  body: Readable,
+  drive: drive_v3.Drive,
+  content: Buffer,
   fileName: string = "downloaded_file",
   folderId?: string,
-): Promise<void> {
-  // Create the drive interface with the auth client
-  // This will complain about type compatibility but works at runtime
-  const drive = google.drive({
-    version: "v3",
-    auth: authClient,
-  });
-  console.log(`Uploading ${fileName} to Google Drive with authClient`);
+  existingFileId?: string,
+): Promise<string | null> {
+  // Determine the appropriate MIME type based on file extension
+  const mimeType = getMimeType(fileName);
+  console.log(`Using MIME type: ${mimeType} for file: ${fileName}`);
 
-  // Validate folder ID before proceeding
-  if (folderId) {
+  if (existingFileId) {
+    console.log(`Updating ${fileName} (ID: ${existingFileId}) in Google Drive`);
     try {
-      // Check if folder exists
-      await drive.files.get({
-        fileId: folderId,
-        fields: "id,name,mimeType",
+      await drive.files.update({
+        fileId: existingFileId,
+        requestBody: { name: fileName, mimeType: mimeType },
+        media: {
+          mimeType: mimeType,
+          body: Readable.from(content),
+        },
         supportsAllDrives: true,
       });
-      console.log(`Verified folder with ID: ${folderId}`);
+      console.log(`File ${fileName} updated in Google Drive`);
+      return existingFileId;
     } catch (error) {
-      const errorMessage =
-        error instanceof Error ? error.message : String(error);
-      console.error(`Error with folder ID (${folderId}): ${errorMessage}`);
-      console.log("Uploading to root folder instead.");
-      folderId = undefined; // Reset folder ID to upload to root
+      // A file deleted from Drive since the last run is uploaded afresh below
+      const status = (error as { response?: { status?: number } }).response
+        ?.status;
+      if (status !== 404) {
+        const errorMessage =
+          error instanceof Error ? error.message : String(error);
+        console.error(`Error updating file ${fileName}: ${errorMessage}`);
+        return null;
+      }
+      console.log(`File ${existingFileId} no longer exists, uploading anew`);
     }
   }
 
-  // Determine the appropriate MIME type based on file extension
-  const mimeType = getMimeType(fileName);
-  console.log(`Using MIME type: ${mimeType} for file: ${fileName}`);
+  console.log(`Uploading ${fileName} to Google Drive`);
 
   const requestBody: DriveRequestBody = {
     name: fileName,
@@ -523,7 +752,7 @@ async function uploadToDrive(
       requestBody,
       media: {
         mimeType: mimeType,
-        body: body,
+        body: Readable.from(content),
       },
       supportsAllDrives: true,
       supportsTeamDrives: true,
@@ -533,9 +762,11 @@ async function uploadToDrive(
     console.log(
       `File ${fileName} uploaded to Google Drive${folderId ? " folder" : ""} with ID: ${fileId || "unknown"}`,
     );
+    return fileId || "";
   } catch (error) {
     const errorMessage = error instanceof Error ? error.message : String(error);
     console.error(`Error uploading file ${fileName}: ${errorMessage}`);
+    return null;
   }
 }
 
@@ -555,22 +786,74 @@ async function main(): Promise<void> {
       await deleteAllFilesInFolder(client, FOLDER_ID);
     }
 
-    console.log(`Processing ${resourceLinks.length} resource links...`);
-    let processedCount = 0;
+    // Create the Drive client and check the upload folder once for all uploads
+    const drive = google.drive({ version: "v3", auth: client });
+    const uploadFolderId = await resolveUploadFolder(drive, FOLDER_ID);
+
+    // After a wipe every resource has to be uploaded again, so ignore the manifest
+    const manifest: ResourceManifest = shouldDeleteFirst
+      ? {}
+      : await loadManifest();
 
-    // Process each resource URL
+    console.log(`Processing ${resourceLinks.size} resource links...`);
+
+    // Group links by source in a single pass so each source gets its own pool
+    const linksBySource = new Map<string, string[]>();
+    let totalCount = 0;
     for (const link of resourceLinks) {
-      await downloadFileAndUploadToDrive(link, client, FOLDER_ID);
-      processedCount++;
-
-      // Basic progress reporting
-      if (processedCount % 5 === 0 || processedCount === resourceLinks.length) {
-        console.log(
-          `Progress: ${processedCount}/${resourceLinks.length} files processed`,
-        );
+      const sourceType = getSourceType(link);
+      if (!sourceType) {
+        console.error(`Unsupported source URL: ${link}`);
+        continue;
+      }
+      const sourceLinks = linksBySource.get(sourceType);
+      if (sourceLinks) {
+        sourceLinks.push(link);
+      } else {
+        linksBySource.set(sourceType, [link]);
+      }
+      totalCount++;
+    }
+
+    // Payloads uploaded by earlier runs count as seen, so a URL that was
+    // skipped as a duplicate last time isn't uploaded as a second copy now
+    const seenDigests = new Set<string>();
+    for (const entry of Object.values(manifest)) {
+      if (entry.digest) {
+        seenDigests.add(entry.digest);
       }
     }
+    let processedCount = 0;
+
+    // Sources are independent, so their pools run side by side; each pool
+    // is capped by the source's own limit to respect its rate limits
+    await Promise.all(
+      Array.from(linksBySource, ([sourceType, sourceLinks]) =>
+        forEachWithConcurrency(
+          sourceLinks,
+          resourceSources[sourceType].maxConcurrency,
+          async (link) => {
+            await downloadFileAndUploadToDrive(
+              link,
+              drive,
+              uploadFolderId,
+              manifest,
+              seenDigests,
+            );
+            processedCount++;
+
+            // Basic progress reporting
+            if (processedCount % 5 === 0 || processedCount === totalCount) {
+              console.log(
+                `Progress: ${processedCount}/${totalCount} files processed`,
+              );
+            }
+          },
+        ),
+      ),
+    );
 
+    await saveManifest(manifest);
     console.log("All resources processed successfully!");
   } catch (error) {
     const errorMessage = error instanceof Error ? error.message : String(error);
@@ -579,8 +862,10 @@ async function main(): Promise<void> {
   }
 }
 
-// Run the main function
-main().catch((error) => {
-  console.error("Unhandled error:", error);
-  process.exit(1);
-});
+// Run the main function when executed directly, not when imported
+if (require.main === module) {
+  main().catch((error) => {
+    console.error("Unhandled error:", error);
+    process.exit(1);
+  });
+}
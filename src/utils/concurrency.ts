@@ -0,0 +1,83 @@
+/**
+ * Utilities for running I/O-bound work concurrently
+ */
+
+/**
+ * Runs an async task for every item while keeping at most `limit` tasks in flight
+ * @param items The items to process
+ * @param limit Maximum number of tasks running at the same time
+ * @param task The async task to run for each item
+ * @returns The task results, in the same order as the items
+ */
+export async function mapWithConcurrency<T, R>(
+  items: readonly T[],
+  limit: number,
+  task: (item: T, index: number) => Promise<R>,
+): Promise<R[]> {
+  const results: R[] = new Array(items.length);
+  let nextIndex = 0;
+
+  // Each worker pulls the next unclaimed item until none are left
+  const worker = async () => {
+    while (nextIndex < items.length) {
+      const index = nextIndex++;
+      results[index] = await task(items[index], index);
+    }
+  };
+
+  const workerCount = Math.min(Math.max(limit, 1), items.length);
+  await Promise.all(Array.from({ length: workerCount }, worker));
+
+  return results;
+}
+
+/**
+ * Runs an async task for every item of a (possibly async) iterable while keeping
+ * at most `limit` tasks in flight. Items are pulled lazily, so a database cursor
+ * can be streamed without loading every document into memory first. If a task
+ * fails, no further items are pulled and the first error is rethrown once the
+ * tasks already running have settled.
+ * @param items The items to process
+ * @param limit Maximum number of tasks running at the same time
+ * @param task The async task to run for each item
+ */
+export async function forEachWithConcurrency<T>(
+  items: Iterable<T> | AsyncIterable<T>,
+  limit: number,
+  task: (item: T, index: number) => Promise<void>,
+): Promise<void> {
+  const inFlight = new Set<Promise<void>>();
+  let index = 0;
+  let failed = false;
+  let firstError: unknown;
+
+  for await (const item of items) {
+    if (failed) {
+      break;
+    }
+
+    // Handle each task's failure as soon as it starts, so a rejection is
+    // never left unhandled while the loop is waiting on another task
+    const itemIndex = index++;
+    const running: Promise<void> = Promise.resolve()
+      .then(() => task(item, itemIndex))
+      .catch((error) => {
+        if (!failed) {
+          failed = true;
+          firstError = error;
+        }
+      })
+      .finally(() => inFlight.delete(running));
+    inFlight.add(running);
+
+    // Wait for a slot to free up before pulling the next item
+    if (inFlight.size >= Math.max(limit, 1)) {
+      await Promise.race(inFlight);
+    }
+  }
+
+  await Promise.allSettled(inFlight);
+  if (failed) {
+    throw firstError;
+  }
+}
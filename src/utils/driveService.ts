@@ -1,5 +1,5 @@
-import { google } from "googleapis";
-import { Stream } from "stream";
+// googleapis is large, so it is only loaded once Drive is actually used
+import type { google, drive_v3 } from "googleapis";
 // import { authenticate } from "@google-cloud/local-auth";
 import * as fs from "fs/promises";
 import * as path from "path";
@@ -8,6 +8,10 @@ import { DriveFileInfo, FileContent } from "./types";
 const TOKEN_PATH = path.join(process.cwd(), "token.json");
 const CREDENTIALS_PATH = path.join(process.cwd(), "credentials.json");
 type OAuth2Client = typeof google.auth.OAuth2.prototype;
+
+// Authorized clients by scope set, so token.json is read and parsed only once
+const authClientPromises = new Map<string, Promise<OAuth2Client>>();
+
 /**
  * Load or request or authorization to call APIs.
  *
@@ -19,6 +23,27 @@ export async function authorize(
     "https://www.googleapis.com/auth/drive.file",
   ],
 ): Promise<OAuth2Client> {
+  const key = [...scopes].sort().join(" ");
+  let clientPromise = authClientPromises.get(key);
+  if (!clientPromise) {
+    clientPromise = loadOrRequestClient(scopes);
+    authClientPromises.set(key, clientPromise);
+    // Allow the next caller to retry if authorization failed
+    clientPromise.catch(() => {
+      authClientPromises.delete(key);
+    });
+  }
+  return clientPromise;
+}
+
+/**
+ * Loads saved credentials, or runs the local authentication flow if there are
+ * none.
+ *
+ * @param {string[]} scopes
+ * @return {Promise<OAuth2Client>}
+ */
+async function loadOrRequestClient(scopes: string[]): Promise<OAuth2Client> {
   let client: OAuth2Client | null =
     (await loadSavedCredentialsIfExist()) as OAuth2Client;
   if (client) {
@@ -42,6 +67,28 @@ export async function authorize(
   return client;
 }
 
+// Drive client shared by every listing and download, created on first use
+let driveClientPromise: Promise<drive_v3.Drive> | null = null;
+
+/**
+ * Returns the shared Drive API client, authorizing only on first use.
+ *
+ * @return {Promise<drive_v3.Drive>}
+ */
+async function getDriveClient(): Promise<drive_v3.Drive> {
+  if (!driveClientPromise) {
+    driveClientPromise = Promise.all([
+      authorize(),
+      import("googleapis"),
+    ]).then(([auth, { google }]) => google.drive({ version: "v3", auth }));
+    // Allow the next caller to retry if authorization failed
+    driveClientPromise.catch(() => {
+      driveClientPromise = null;
+    });
+  }
+  return driveClientPromise;
+}
+
 /**
  * Reads previously authorized credentials from the save file.
  *
@@ -51,6 +98,7 @@ async function loadSavedCredentialsIfExist(): Promise<OAuth2Client | null> {
   try {
     const content: string = String(await fs.readFile(TOKEN_PATH));
     const credentials = JSON.parse(content);
+    const { google } = await import("googleapis");
     return google.auth.fromJSON(credentials) as OAuth2Client;
   } catch (err) {
     console.error("Error loading credentials:", err);
@@ -108,6 +156,60 @@ const MIME_TYPES: Record<string, string> = {
   ".svg": "image/svg+xml",
 };
 
+// Checks for a JSON object without trimming (and so copying) the whole content
+const JSON_OBJECT_START_PATTERN = /^\s*\{/;
+
+// Common patterns that indicate an actual login page. Matching is
+// case-insensitive so the content never has to be lowercased (and copied).
+const STRONG_AUTH_PATTERN = new RegExp(
+  [
+    "<title>sign in</title>",
+    "<title>log in</title>",
+    "accounts\\.google\\.com/servicelogin",
+    "google\\.com/accounts/servicelogin",
+    'action="https://accounts\\.google\\.com',
+    "need to sign in",
+    "you'll need to sign in",
+    "please sign in to access",
+    "login to continue",
+    "permission denied",
+    "access denied",
+  ].join("|"),
+  "i",
+);
+
+// Weaker patterns that only indicate a login page in combination
+const WEAK_AUTH_PATTERNS = [/sign in/i, /login/i, /log in/i, /credentials/i];
+
+const HTML_TAG_PATTERN = /<html/i;
+
+// MIME type fragments of text-based files
+const TEXT_MIME_TYPES = [
+  "text/",
+  "application/json",
+  "application/x-ipynb+json",
+  "application/javascript",
+  "application/typescript",
+  "application/xml",
+];
+
+// Extensions of text-based files, for when no MIME type is known
+const TEXT_FILE_EXTENSIONS = new Set([
+  ".txt",
+  ".py",
+  ".js",
+  ".ts",
+  ".html",
+  ".css",
+  ".json",
+  ".ipynb",
+  ".md",
+  ".csv",
+  ".xml",
+  ".r",
+  ".sh",
+]);
+
 /**
  * Determines if content is a login or authentication page
  * @param content The content to check
@@ -116,50 +218,29 @@ const MIME_TYPES: Record<string, string> = {
 function isAuthPage(content: string): boolean {
   // Don't consider it an auth page if it's a valid JSON notebook
   if (
-    content.trim().startsWith("{") &&
+    JSON_OBJECT_START_PATTERN.test(content) &&
     content.includes('"cells":') &&
     content.includes('"metadata":')
   ) {
     return false;
   }
 
-  // Common patterns that indicate an actual login page
-  const strongAuthPatterns = [
-    "<title>sign in</title>",
-    "<title>log in</title>",
-    "accounts.google.com/servicelogin",
-    "google.com/accounts/servicelogin",
-    'action="https://accounts.google.com',
-    "need to sign in",
-    "you'll need to sign in",
-    "please sign in to access",
-    "login to continue",
-    "permission denied",
-    "access denied",
-  ];
-
   // Check for strong patterns first
-  const lowerContent = content.toLowerCase();
-  for (const pattern of strongAuthPatterns) {
-    if (lowerContent.includes(pattern)) {
-      return true;
-    }
+  if (STRONG_AUTH_PATTERN.test(content)) {
+    return true;
   }
 
   // For weaker patterns, look for combinations of indicators
-  const weakAuthPatterns = ["sign in", "login", "log in", "credentials"];
-
-  // Count how many weak patterns appear
   let weakPatternCount = 0;
-  for (const pattern of weakAuthPatterns) {
-    if (lowerContent.includes(pattern)) {
+  for (const pattern of WEAK_AUTH_PATTERNS) {
+    if (pattern.test(content)) {
       weakPatternCount++;
     }
   }
 
   // Only consider it an auth page if multiple weak patterns appear
   // AND it's an HTML page (not JSON)
-  return weakPatternCount >= 2 && lowerContent.includes("<html");
+  return weakPatternCount >= 2 && HTML_TAG_PATTERN.test(content);
 }
 /**
  * Builds a query string to find resources in a folder, supporting multiple file types
@@ -227,8 +308,7 @@ export async function listResourcesInDrive(
   maxFiles?: number,
 ): Promise<DriveFileInfo[]> {
   try {
-    const auth = await authorize();
-    const drive = google.drive({ version: "v3", auth });
+    const drive = await getDriveClient();
 
     const query = buildDriveQuery(folderId, fileTypes);
     console.log(`Listing files from Google Drive with query: ${query}`);
@@ -271,22 +351,24 @@ export async function listResourcesInDrive(
       const files = response.data.files || [];
       nextPageToken = response.data.nextPageToken;
 
-      const mappedFiles = files.map((file) => ({
-        id: file.id || "",
-        name: file.name || "",
-        mimeType: file.mimeType || undefined,
-        webViewLink: file.webViewLink || undefined,
-        createdTime: file.createdTime || undefined,
-        modifiedTime: file.modifiedTime || undefined,
-        size: file.size ? parseInt(file.size) : undefined,
-        iconLink: file.iconLink || undefined,
-      }));
-
-      allFiles = [...allFiles, ...mappedFiles];
+      // Append in place; re-spreading the accumulated list every page
+      // would copy it again each time
+      for (const file of files) {
+        allFiles.push({
+          id: file.id || "",
+          name: file.name || "",
+          mimeType: file.mimeType || undefined,
+          webViewLink: file.webViewLink || undefined,
+          createdTime: file.createdTime || undefined,
+          modifiedTime: file.modifiedTime || undefined,
+          size: file.size ? parseInt(file.size) : undefined,
+          iconLink: file.iconLink || undefined,
+        });
+      }
       filesCount = allFiles.length;
 
       console.log(
-        `Retrieved ${mappedFiles.length} files in this page. Total so far: ${filesCount}`,
+        `Retrieved ${files.length} files in this page. Total so far: ${filesCount}`,
       );
 
       if (maxFiles && filesCount >= maxFiles) {
@@ -315,38 +397,14 @@ export async function listResourcesInDrive(
 function isTextBasedFile(mimeType?: string, fileName?: string): boolean {
   if (!mimeType && !fileName) return false;
 
-  const textMimeTypes = [
-    "text/",
-    "application/json",
-    "application/x-ipynb+json",
-    "application/javascript",
-    "application/typescript",
-    "application/xml",
-  ];
-
   // Check MIME type
   if (mimeType) {
-    return textMimeTypes.some((textType) => mimeType.includes(textType));
+    return TEXT_MIME_TYPES.some((textType) => mimeType.includes(textType));
   }
 
   // Check file extension
   if (fileName) {
-    const ext = path.extname(fileName).toLowerCase();
-    return [
-      ".txt",
-      ".py",
-      ".js",
-      ".ts",
-      ".html",
-      ".css",
-      ".json",
-      ".ipynb",
-      ".md",
-      ".csv",
-      ".xml",
-      ".r",
-      ".sh",
-    ].includes(ext);
+    return TEXT_FILE_EXTENSIONS.has(path.extname(fileName).toLowerCase());
   }
 
   return false;
@@ -357,125 +415,130 @@ function isTextBasedFile(mimeType?: string, fileName?: string): boolean {
  * Handles authentication errors and different file types.
  *
  * @param fileId The ID of the file to download
+ * @param knownMetadata Name and MIME type already known from a folder listing;
+ * when given, the extra metadata request is skipped
  * @returns The content of the file or null if error/authentication required
  */
 export async function downloadResourcesFromDrive(
   fileId: string,
+  knownMetadata?: Pick<DriveFileInfo, "name" | "mimeType">,
 ): Promise<FileContent | null> {
   try {
-    const auth = await authorize();
-    const drive = google.drive({ version: "v3", auth });
+    const drive = await getDriveClient();
     console.log(`Downloading file with ID: ${fileId}`);
 
-    // First, get file metadata to determine the type
     try {
-      const fileMetadata = await drive.files.get({
-        fileId: fileId,
-        fields: "name,mimeType,size",
-        supportsAllDrives: true,
-        supportsTeamDrives: true,
-      });
+      let fileName = knownMetadata?.name || "";
+      let mimeType = knownMetadata?.mimeType || "";
 
-      const fileName = fileMetadata.data.name || "";
-      const mimeType = fileMetadata.data.mimeType || "";
+      // Only fetch metadata to determine the type if the caller doesn't have it
+      if (!knownMetadata) {
+        const fileMetadata = await drive.files.get({
+          fileId: fileId,
+          fields: "name,mimeType,size",
+          supportsAllDrives: true,
+          supportsTeamDrives: true,
+        });
+
+        fileName = fileMetadata.data.name || "";
+        mimeType = fileMetadata.data.mimeType || "";
+      }
 
       console.log(`File metadata: name=${fileName}, mimeType=${mimeType}`);
 
-      // Download the file content
+      // Download the whole file content in a single media request
       const response = await drive.files.get(
         {
           fileId: fileId,
           alt: "media",
+          supportsAllDrives: true,
         },
-        { responseType: "stream" },
+        { responseType: "arraybuffer" },
       );
 
-      // Convert the stream to Buffer
-      const buffer = await streamToBuffer(response.data);
+      // Wrap the response body without copying it
+      const buffer = Buffer.from(response.data as unknown as ArrayBuffer);
+
+      // Binary files are returned as-is, so only text files are decoded
+      if (!isTextBasedFile(mimeType, fileName)) {
+        console.log(`Binary file detected: ${fileName}`);
+        return {
+          data: buffer,
+          mimeType: mimeType,
+        };
+      }
+
       const content = buffer.toString("utf8");
 
       // Check if this is an auth page (indicating we don't have proper access)
-      if (isTextBasedFile(mimeType, fileName) && isAuthPage(content)) {
+      if (isAuthPage(content)) {
         console.error(
           `File ${fileId} (${fileName}) requires authentication - received login page`,
         );
         return null;
       }
 
-      // Process content based on file type
-      if (isTextBasedFile(mimeType, fileName)) {
-        // For text-based files
-        // If it's a Jupyter notebook or JSON, try to parse it
-        if (
-          mimeType === "application/x-ipynb+json" ||
-          (fileName && fileName.toLowerCase().endsWith(".ipynb")) ||
-          mimeType === "application/json"
-        ) {
-          if (!content.trim().startsWith("{")) {
-            console.error(`File ${fileId} is not valid JSON`);
-            console.log(
-              `Content starts with: ${content.substring(0, 50).replace(/\n/g, " ")}`,
-            );
-
-            // Create a minimal valid notebook structure if it's a notebook
-            if (
-              mimeType === "application/x-ipynb+json" ||
-              (fileName && fileName.toLowerCase().endsWith(".ipynb"))
-            ) {
-              return {
-                cells: [],
-                metadata: {
-                  kernelspec: {
-                    display_name: "Python 3",
-                    language: "python",
-                    name: "python3",
-                  },
+      // If it's a Jupyter notebook or JSON, try to parse it
+      if (
+        mimeType === "application/x-ipynb+json" ||
+        (fileName && fileName.toLowerCase().endsWith(".ipynb")) ||
+        mimeType === "application/json"
+      ) {
+        if (!JSON_OBJECT_START_PATTERN.test(content)) {
+          console.error(`File ${fileId} is not valid JSON`);
+          console.log(
+            `Content starts with: ${content.substring(0, 50).replace(/\n/g, " ")}`,
+          );
+
+          // Create a minimal valid notebook structure if it's a notebook
+          if (
+            mimeType === "application/x-ipynb+json" ||
+            (fileName && fileName.toLowerCase().endsWith(".ipynb"))
+          ) {
+            return {
+              cells: [],
+              metadata: {
+                kernelspec: {
+                  display_name: "Python 3",
+                  language: "python",
+                  name: "python3",
                 },
-                nbformat: 4,
-                nbformat_minor: 4,
-                raw_content: content.substring(0, 5000), // Store the raw content for analysis
-              };
-            }
-            // Return as text for other JSON files
-            return content;
+              },
+              nbformat: 4,
+              nbformat_minor: 4,
+              raw_content: content.substring(0, 5000), // Store the raw content for analysis
+            };
           }
+          // Return as text for other JSON files
+          return content;
+        }
 
-          // Parse the content as JSON
-          try {
-            const jsonContent = JSON.parse(content);
-
-            // For Jupyter notebooks, validate the format
-            if (
-              mimeType === "application/x-ipynb+json" ||
-              (fileName && fileName.toLowerCase().endsWith(".ipynb"))
-            ) {
-              if (!jsonContent.cells) {
-                console.warn(
-                  `Notebook ${fileId} doesn't have 'cells' property`,
-                );
-                jsonContent.cells = [];
-              }
+        // Parse the content as JSON
+        try {
+          const jsonContent = JSON.parse(content);
+
+          // For Jupyter notebooks, validate the format
+          if (
+            mimeType === "application/x-ipynb+json" ||
+            (fileName && fileName.toLowerCase().endsWith(".ipynb"))
+          ) {
+            if (!jsonContent.cells) {
+              console.warn(`Notebook ${fileId} doesn't have 'cells' property`);
+              jsonContent.cells = [];
             }
-
-            return jsonContent;
-          } catch (e) {
-            console.error(`Error parsing file as JSON: ${e}`);
-            // Return as text if parsing fails
-            return content;
           }
-        }
 
-        // Return as text for other text-based files
-        console.log(`Text file detected: ${fileName}`);
-        return content;
-      } else {
-        // For binary files, return the buffer with metadata
-        console.log(`Binary file detected: ${fileName}`);
-        return {
-          data: buffer,
-          mimeType: mimeType,
-        };
+          return jsonContent;
+        } catch (e) {
+          console.error(`Error parsing file as JSON: ${e}`);
+          // Return as text if parsing fails
+          return content;
+        }
       }
+
+      // Return as text for other text-based files
+      console.log(`Text file detected: ${fileName}`);
+      return content;
     } catch (error) {
       // Check if this is a permission error
       const errorMessage = String(error);
@@ -495,18 +558,3 @@ export async function downloadResourcesFromDrive(
     return null;
   }
 }
-
-/**
- * Convert a stream to a buffer
- *
- * @param stream The stream to convert
- * @returns Promise resolving to a Buffer
- */
-function streamToBuffer(stream: Stream): Promise<Buffer> {
-  const chunks: Buffer[] = [];
-  return new Promise((resolve, reject) => {
-    stream.on("data", (chunk) => chunks.push(Buffer.from(chunk)));
-    stream.on("error", (err) => reject(err));
-    stream.on("end", () => resolve(Buffer.concat(chunks)));
-  });
-}
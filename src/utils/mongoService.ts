@@ -7,10 +7,22 @@ import {
   FileContent,
   FileInfo,
   BinaryContent,
+  ResourceUpdate,
 } from "./types";
 import { createEnhancedQueryText, logQueryParsing } from "./phraseAwareSearch";
+import { forEachWithConcurrency } from "./concurrency";
+import {
+  VectorIndex,
+  CachedResource,
+  buildVectorIndex,
+  searchVectorIndex,
+} from "./vectorCache";
 import * as fs from "fs";
 import * as path from "path";
+import { createHash } from "crypto";
+import * as zlib from "zlib";
+import { Readable } from "stream";
+import { pipeline } from "stream/promises";
 
 // Reload environment variables to ensure we have the latest values
 dotenv.config({ override: true });
@@ -32,8 +44,46 @@ const connectionOptions = {
   minPoolSize: 5, // Min pool size
   maxIdleTimeMS: 30000, // How long a connection can stay idle in the pool
   waitQueueTimeoutMS: 10000, // How long a thread can wait for a connection
+  // Compress wire traffic; notebook JSON shrinks several times over, which
+  // cuts network bytes on ingestion and export (zlib needs no extra package)
+  compressors: ["zlib"] as mongoDb.CompressorName[],
+};
+
+// Maximum number of files written at the same time during export
+const EXPORT_CONCURRENCY = 8;
+// Number of documents fetched per cursor round-trip during export
+const EXPORT_BATCH_SIZE = 50;
+
+// Ingestion writes only wait for the primary's acknowledgement, not for a
+// journal sync; a lost write is recovered by re-running ingestion
+const ingestWriteConcern: mongoDb.WriteConcernSettings = {
+  w: 1,
+  journal: false,
 };
 
+/**
+ * Creates the indexes resource lookups, upserts and the embedding cache rely on.
+ * Called by ingestion rather than on connect, so the web app's search and
+ * listing routes never wait on index builds. Failures are logged rather than
+ * thrown so ingestion can still run against an existing collection
+ */
+export async function ensureIndexes() {
+  const db = await connectToDatabase();
+  const resources = db.collection("resources");
+  try {
+    await Promise.all([
+      resources.createIndex({ url: 1 }, { unique: true }),
+      resources.createIndex({ drive_id: 1 }),
+      resources.createIndex({ metadata_processed: 1, drive_id: 1 }),
+      db
+        .collection("embedding_cache")
+        .createIndex({ hash: 1, model: 1 }, { unique: true }),
+    ]);
+  } catch (error) {
+    console.error("Error creating indexes:", error);
+  }
+}
+
 /**
  * Connect to MongoDB database
  * @param forceReconnect Whether to force a reconnection
@@ -176,25 +226,94 @@ export async function forceReconnectToMongoDB() {
   return connectToDatabase(true);
 }
 
+// Model used for query embeddings; must match the one resources are embedded with
+const QUERY_EMBEDDING_MODEL = "text-embedding-3-large";
+// Maximum number of query embeddings kept in memory
+const QUERY_EMBEDDING_CACHE_SIZE = 1024;
+
+// Recently used query embeddings, keyed by model and enhanced query text.
+// A Map iterates in insertion order, so its first key is the least recently used
+const queryEmbeddingCache = new Map<string, number[]>();
+
+// Shared OpenAI client, created on first use
+let openaiClient: OpenAI | null = null;
+
+/**
+ * Gets the shared OpenAI client, creating it on first use
+ * @returns The OpenAI client
+ */
+function getOpenAIClient(): OpenAI {
+  if (!openaiClient) {
+    const OPENAI_API_KEY = process.env.OPENAI_API_KEY;
+    if (!OPENAI_API_KEY) {
+      throw new Error("Missing OPENAI_API_KEY environment variable");
+    }
+    openaiClient = new OpenAI({ apiKey: OPENAI_API_KEY });
+  }
+  return openaiClient;
+}
+
+/**
+ * Returns the embedding of a text, reusing the one stored in the embedding
+ * cache collection if the same text was embedded with the same model before.
+ * Cache failures are logged and fall back to creating the embedding
+ * @param text The exact text being embedded
+ * @param model The embedding model
+ * @param create Creates the embedding when it isn't cached
+ * @returns The embedding vector
+ */
+export async function getOrCreateEmbedding(
+  text: string,
+  model: string,
+  create: () => Promise<number[]>,
+): Promise<number[]> {
+  const hash = createHash("sha256").update(text).digest("hex");
+
+  let cache: mongoDb.Collection | null = null;
+  try {
+    const db = await connectToDatabase();
+    cache = db.collection("embedding_cache", {
+      writeConcern: ingestWriteConcern,
+    });
+    const cached = await cache.findOne(
+      { hash, model },
+      { projection: { _id: 0, vector: 1 } },
+    );
+    if (cached && Array.isArray(cached.vector)) {
+      return cached.vector;
+    }
+  } catch (error) {
+    console.error("Error reading embedding cache:", error);
+  }
+
+  const vector = await create();
+
+  if (cache) {
+    try {
+      await cache.updateOne(
+        { hash, model },
+        { $setOnInsert: { hash, model, vector, created_at: new Date() } },
+        { upsert: true },
+      );
+    } catch (error) {
+      console.error("Error writing embedding cache:", error);
+    }
+  }
+
+  return vector;
+}
+
 /**
  * Generates embeddings for the query, with phrase-aware handling
+ * Repeated queries are served from an in-memory LRU cache, backed by the
+ * embedding cache collection
  * @param query The user query string
  * @returns Vector embedding array
  */
 async function embedQuery(query: string) {
-  dotenv.config();
-  const EMBEDDING_MODEL = "text-embedding-3-large";
-  const OPENAI_API_KEY = process.env.OPENAI_API_KEY;
-
-  if (!OPENAI_API_KEY) {
-    throw new Error("Missing OPENAI_API_KEY environment variable");
-  }
+  const client = getOpenAIClient();
 
   try {
-    const openaiClient = new OpenAI({
-      apiKey: OPENAI_API_KEY,
-    });
-
     const enhancedQuery = createEnhancedQueryText(query);
 
     if (process.env.NODE_ENV === "development") {
@@ -202,16 +321,41 @@ async function embedQuery(query: string) {
       console.log("Enhanced query:", enhancedQuery);
     }
 
-    const response = await openaiClient.embeddings.create({
-      input: enhancedQuery,
-      model: EMBEDDING_MODEL,
-    });
+    const cacheKey = `${QUERY_EMBEDDING_MODEL}\u0000${enhancedQuery}`;
+    const cached = queryEmbeddingCache.get(cacheKey);
+    if (cached) {
+      // Re-insert to mark the entry as most recently used
+      queryEmbeddingCache.delete(cacheKey);
+      queryEmbeddingCache.set(cacheKey, cached);
+      return cached;
+    }
+
+    const embedding = await getOrCreateEmbedding(
+      enhancedQuery,
+      QUERY_EMBEDDING_MODEL,
+      async () => {
+        const response = await client.embeddings.create({
+          input: enhancedQuery,
+          model: QUERY_EMBEDDING_MODEL,
+        });
+
+        if (!response.data || response.data.length === 0) {
+          throw new Error("Empty embedding response from OpenAI");
+        }
 
-    if (!response.data || response.data.length === 0) {
-      throw new Error("Empty embedding response from OpenAI");
+        return response.data[0].embedding;
+      },
+    );
+    queryEmbeddingCache.set(cacheKey, embedding);
+    if (queryEmbeddingCache.size > QUERY_EMBEDDING_CACHE_SIZE) {
+      // Evict the least recently used entry
+      const oldestKey = queryEmbeddingCache.keys().next().value;
+      if (oldestKey !== undefined) {
+        queryEmbeddingCache.delete(oldestKey);
+      }
     }
 
-    return response.data[0].embedding;
+    return embedding;
   } catch (error) {
     console.error("OpenAI embedding generation error:", error);
     throw new Error(
@@ -220,8 +364,12 @@ async function embedQuery(query: string) {
   }
 }
 
+// Number of drive IDs fetched per round-trip when listing processed files
+const PROCESSED_IDS_BATCH_SIZE = 1000;
+
 /**
- * Get a list of all file IDs that are already in the database
+ * Get a list of all file IDs that are already in the database and have been
+ * fully processed
  */
 export async function getProcessedFileIds(): Promise<string[]> {
   try {
@@ -229,15 +377,22 @@ export async function getProcessedFileIds(): Promise<string[]> {
     const db = await connectToDatabase(false);
     const resources = db.collection("resources");
 
-    // Query for all documents that have a drive_id field
-    const result = await resources
-      .find({ drive_id: { $exists: true } }, { projection: { drive_id: 1 } })
-      .toArray();
-
-    // Extract drive_ids from the results
-    const driveIds = result
-      .map((doc) => doc.drive_id)
-      .filter((id) => id && typeof id === "string");
+    // Query for all processed documents that have a drive_id field, fetching
+    // only the ID itself in large batches
+    const cursor = resources
+      .find(
+        { drive_id: { $exists: true }, metadata_processed: true },
+        { projection: { _id: 0, drive_id: 1 } },
+      )
+      .batchSize(PROCESSED_IDS_BATCH_SIZE);
+
+    // Extract drive_ids in a single pass over the cursor
+    const driveIds: string[] = [];
+    for await (const doc of cursor) {
+      if (doc.drive_id && typeof doc.drive_id === "string") {
+        driveIds.push(doc.drive_id);
+      }
+    }
 
     console.log(
       `Found ${driveIds.length} already processed files in the database`,
@@ -250,66 +405,252 @@ export async function getProcessedFileIds(): Promise<string[]> {
 }
 
 /**
- * Update an existing resource in the database with new content and metadata
+ * Builds the fields written when an existing resource is re-processed
+ * @param content The new content of the resource
+ * @param info The new metadata of the resource
+ * @returns The fields to $set on the resource document
  */
-export async function updateExistingResource(
-  driveId: string,
-  content: FileContent,
-  info: FileInfo,
-): Promise<void> {
-  try {
-    const db = await connectToDatabase();
-    const resources = db.collection("resources");
-
-    // Find the resource by drive_id
-    const existingResource = await resources.findOne({ drive_id: driveId });
+function buildResourceUpdate(content: FileContent, info: FileInfo) {
+  return {
+    content: content,
+    title: info.title,
+    language: info.language,
+    course_level: info.course_level,
+    cs_concepts: info.cs_concepts,
+    context: info.context,
+    description: info.description,
+    sequence_position: info.sequence_position,
+    vector_embedding: info.vector_embedding,
+    content_sample: info.content_sample,
+    file_type: info.file_type,
+    university: info.university,
+    author: info.author,
+    original_filename: info.original_filename,
+    metadata_processed: true,
+    updated_at: new Date(),
+  };
+}
 
-    if (!existingResource) {
-      throw new Error(`Resource with drive_id ${driveId} not found`);
-    }
+/**
+ * Updates a batch of existing resources in a single bulk write
+ * @param batch The resource updates to apply
+ */
+export async function updateResourcesInMongoDB(batch: ResourceUpdate[]) {
+  if (batch.length === 0) {
+    return;
+  }
 
-    // Update the resource with new information
-    const updateResult = await resources.updateOne(
-      { drive_id: driveId },
-      {
-        $set: {
-          content: content,
-          title: info.title,
-          language: info.language,
-          course_level: info.course_level,
-          cs_concepts: info.cs_concepts,
-          context: info.context,
-          description: info.description,
-          sequence_position: info.sequence_position,
-          vector_embedding: info.vector_embedding,
-          content_sample: info.content_sample,
-          file_type: info.file_type,
-          university: info.university,
-          author: info.author,
-          original_filename: info.original_filename,
-          updated_at: new Date(),
-        },
+  const db = await connectToDatabase();
+  const resources = db.collection("resources", {
+    writeConcern: ingestWriteConcern,
+  });
+
+  const result = await resources.bulkWrite(
+    batch.map(({ driveId, content, info }) => ({
+      updateOne: {
+        filter: { drive_id: driveId },
+        update: { $set: buildResourceUpdate(content, info) },
       },
-    );
+    })),
+    { ordered: false },
+  );
 
-    console.log(
-      `Updated resource with drive_id ${driveId}, matched: ${updateResult.matchedCount}, modified: ${updateResult.modifiedCount}`,
-    );
-  } catch (error) {
-    console.error(`Error updating resource with drive_id ${driveId}:`, error);
-    throw error;
+  console.log(
+    `Updated batch of ${batch.length} resources in MongoDB, matched: ${result.matchedCount}, modified: ${result.modifiedCount}`,
+  );
+}
+
+// Resource fields returned with each search result
+const SEARCH_RESULT_FIELDS = {
+  title: 1,
+  url: 1,
+  language: 1,
+  course_level: 1,
+  context: 1,
+  description: 1,
+  sequence_position: 1,
+  cs_concepts: 1,
+  author: 1,
+  university: 1,
+  file_type: 1,
+};
+
+// Opt-in: answer searches from an in-process copy of every embedding instead
+// of Atlas Vector Search. Suited to small corpora that fit in memory
+const VECTOR_CACHE_ENABLED = process.env.VECTOR_CACHE_ENABLED === "true";
+// How long the in-memory copy is used before it is reloaded from MongoDB
+const VECTOR_CACHE_TTL_MS = 5 * 60 * 1000;
+// Number of embeddings fetched per cursor round-trip when loading the cache
+const VECTOR_CACHE_BATCH_SIZE = 200;
+
+// The index searches are served from, and the reload in progress, if any
+let vectorIndex: VectorIndex | null = null;
+let vectorIndexLoadedAt = 0;
+let vectorIndexReload: Promise<VectorIndex> | null = null;
+
+/**
+ * Loads the embedding and search result fields of every resource into an
+ * in-memory vector index
+ * @returns The vector index
+ */
+async function loadVectorIndex(): Promise<VectorIndex> {
+  const db = await connectToDatabase();
+  const cursor = db
+    .collection("resources")
+    .find(
+      { vector_embedding: { $type: "array" } },
+      { projection: { _id: 0, vector_embedding: 1, ...SEARCH_RESULT_FIELDS } },
+    )
+    .batchSize(VECTOR_CACHE_BATCH_SIZE);
+
+  const entries: { embedding: number[]; resource: CachedResource }[] = [];
+  for await (const { vector_embedding, ...resource } of cursor) {
+    entries.push({ embedding: vector_embedding, resource });
+  }
+
+  const index = buildVectorIndex(entries);
+  console.log(`Loaded ${index.resources.length} embeddings into memory`);
+  return index;
+}
+
+/**
+ * Starts reloading the in-memory vector index, unless a reload is already
+ * running, and swaps it in once loaded
+ * @returns The reloaded vector index
+ */
+function reloadVectorIndex(): Promise<VectorIndex> {
+  if (!vectorIndexReload) {
+    vectorIndexReload = loadVectorIndex()
+      .then((index) => {
+        vectorIndex = index;
+        vectorIndexLoadedAt = Date.now();
+        return index;
+      })
+      .finally(() => {
+        vectorIndexReload = null;
+      });
+  }
+  return vectorIndexReload;
+}
+
+/**
+ * Returns the in-memory vector index. Only the first search waits for it to
+ * load; once it is older than VECTOR_CACHE_TTL_MS, searches keep using it
+ * while a fresh copy loads in the background
+ * @returns The vector index
+ */
+async function getVectorIndex(): Promise<VectorIndex> {
+  if (!vectorIndex) {
+    return reloadVectorIndex();
   }
+  if (Date.now() - vectorIndexLoadedAt > VECTOR_CACHE_TTL_MS) {
+    // A failed reload leaves the current copy in place, to be retried by the
+    // next search
+    reloadVectorIndex().catch((error) => {
+      console.error("Error reloading the in-memory vector index:", error);
+    });
+  }
+  return vectorIndex;
+}
+
+/**
+ * Checks a cached resource against the equality filters used in $vectorSearch
+ * @param resource The cached resource
+ * @param vectorFilters Filters of the form { field: value } or
+ * { field: { $in: values } }
+ * @returns Whether the resource passes every filter
+ */
+function matchesVectorFilters(
+  resource: CachedResource,
+  vectorFilters: mongoDb.Document[],
+): boolean {
+  return vectorFilters.every((filter) =>
+    Object.entries(filter).every(([field, condition]) =>
+      condition && typeof condition === "object" && "$in" in condition
+        ? (condition.$in as unknown[]).includes(resource[field])
+        : resource[field] === condition,
+    ),
+  );
+}
+
+// Cleared once Atlas rejects a pre-filter because the filter fields aren't
+// declared in the resources_vector_search index, so later searches go
+// straight to filtering after the search
+let vectorFilterFieldsIndexed = true;
+
+// Atlas's error when a $vectorSearch filter uses a field that isn't indexed
+const UNINDEXED_FILTER_PATTERN = /needs to be indexed/i;
+
+/**
+ * Builds the vector search pipeline
+ * @param queryVector The embedding of the query
+ * @param vectorFilters Equality filters of the form { field: value } or
+ * { field: { $in: values } }
+ * @param context Optional case-insensitive pattern the context has to match
+ * @param limit Maximum number of results to return
+ * @param numCandidates Nearest neighbors considered by the vector search
+ * @param prefilter Whether the equality filters are applied inside
+ * $vectorSearch, which requires them to be filter fields of the index,
+ * rather than in a $match after it
+ * @returns The aggregation pipeline
+ */
+function buildSearchPipeline(
+  queryVector: number[],
+  vectorFilters: mongoDb.Document[],
+  context: string | null,
+  limit: number,
+  numCandidates: number,
+  prefilter: boolean,
+): mongoDb.Document[] {
+  const vectorSearch: mongoDb.Document = {
+    index: "resources_vector_search",
+    path: "vector_embedding",
+    queryVector,
+    numCandidates,
+    limit,
+  };
+  if (prefilter && vectorFilters.length > 0) {
+    vectorSearch.filter = { $and: vectorFilters };
+  }
+
+  const pipeline: mongoDb.Document[] = [{ $vectorSearch: vectorSearch }];
+
+  // $vectorSearch filters don't support regular expressions, so the
+  // context filter always runs as a $match on the results
+  const postFilters = prefilter ? [] : [...vectorFilters];
+  if (context) {
+    postFilters.push({ context: { $regex: context, $options: "i" } });
+  }
+  if (postFilters.length > 0) {
+    pipeline.push({ $match: { $and: postFilters } });
+  }
+
+  // Add projection for result fields; the stored content and embedding
+  // are the bulk of each document and are not needed for results
+  pipeline.push({
+    $project: {
+      ...SEARCH_RESULT_FIELDS,
+      score: { $meta: "vectorSearchScore" },
+    },
+  });
+
+  return pipeline;
 }
 
 /**
  * Search resources using phrase-aware vector search
  * @param query The user's search query
  * @param filters Optional filters to apply alongside vector search
+ * @param limit Maximum number of results to return
+ * @param numCandidates Nearest neighbors considered by the vector search;
+ * scales with the limit so recall holds for larger result sets
  * @returns Array of search results with relevance scores
  */
 export async function searchResources(
   query: string,
   filters: Record<string, string | string[]> = {},
+  limit: number = 10,
+  numCandidates: number = Math.max(limit * 20, 150),
 ) {
   try {
     const db = await connectToDatabase();
@@ -326,60 +667,56 @@ export async function searchResources(
     try {
       const vectorQuery = await embedQuery(query);
 
-      const searchPipeline: mongoDb.Document[] = [
-        {
-          $vectorSearch: {
-            index: "resources_vector_search",
-            path: "vector_embedding",
-            queryVector: vectorQuery,
-            numCandidates: 100,
-            limit: 10,
-          },
+      // Equality filters are applied inside $vectorSearch, so candidates are
+      // pruned during the search instead of being discarded after the limit
+      const vectorFilters: mongoDb.Document[] = [];
+      ["language", "course_level", "sequence_position", "file_type"].forEach(
+        (field) => {
+          const value = filters[field];
+          if (!value) {
+            return;
+          }
+          if (field === "sequence_position" || field === "file_type") {
+            vectorFilters.push({ [field]: String(value).toLowerCase() });
+          } else if (Array.isArray(value)) {
+            vectorFilters.push({ [field]: { $in: value } });
+          } else {
+            vectorFilters.push({ [field]: value });
+          }
         },
-      ];
-
-      if (Object.keys(filters).length > 0) {
-        const filterCriteria: Record<string, string | string[] | object> = {};
-        ["language", "course_level", "sequence_position", "file_type"].forEach(
-          (field) => {
-            if (filters[field]) {
-              if (field === "sequence_position" || field === "file_type") {
-                filterCriteria[field] = String(filters[field]).toLowerCase();
-              } else {
-                filterCriteria[field] = filters[field];
-              }
-            }
-          },
-        );
-
-        if (filters.context && typeof filters.context === "string") {
-          filterCriteria.context = { $regex: filters.context, $options: "i" };
-        }
+      );
 
-        if (Object.keys(filterCriteria).length > 0) {
-          searchPipeline.push({ $match: filterCriteria });
-        }
+      const context =
+        filters.context && typeof filters.context === "string"
+          ? filters.context
+          : null;
+
+      if (VECTOR_CACHE_ENABLED) {
+        // The context is matched as a case-insensitive substring rather than
+        // compiled as a regular expression, so user input can't throw or
+        // stall the server with a pathological pattern
+        const contextNeedle = context?.toLowerCase();
+        const cachedResults: mongoDb.Document[] = searchVectorIndex(
+          await getVectorIndex(),
+          vectorQuery,
+          limit,
+          (resource) =>
+            matchesVectorFilters(resource, vectorFilters) &&
+            (!contextNeedle ||
+              String(resource.context ?? "")
+                .toLowerCase()
+                .includes(contextNeedle)),
+        );
+        return cachedResults;
       }
-
-      // Add projection for result fields
-      searchPipeline.push({
-        $project: {
-          title: 1,
-          content: 1,
-          url: 1,
-          language: 1,
-          course_level: 1,
-          context: 1,
-          description: 1,
-          sequence_position: 1,
-          cs_concepts: 1,
-          vector_embedding: 1,
-          author: 1,
-          university: 1,
-          file_type: 1,
-          score: { $meta: "vectorSearchScore" },
-        },
-      });
+      const searchPipeline = buildSearchPipeline(
+        vectorQuery,
+        vectorFilters,
+        context,
+        limit,
+        numCandidates,
+        vectorFilterFieldsIndexed,
+      );
 
       if (process.env.NODE_ENV === "development") {
         console.log(
@@ -388,8 +725,38 @@ export async function searchResources(
         );
       }
 
-      const results = await resources.aggregate(searchPipeline).toArray();
-      return results;
+      try {
+        return await resources.aggregate(searchPipeline).toArray();
+      } catch (error) {
+        const errorMessage =
+          error instanceof Error ? error.message : String(error);
+        if (
+          !vectorFilterFieldsIndexed ||
+          vectorFilters.length === 0 ||
+          !UNINDEXED_FILTER_PATTERN.test(errorMessage)
+        ) {
+          throw error;
+        }
+
+        // Keep filtered searches working until the index declares the
+        // filter fields, at the cost of filtering after the search
+        vectorFilterFieldsIndexed = false;
+        console.warn(
+          `The resources_vector_search index doesn't declare the filter fields (${errorMessage}). Filtering after the search instead; add language, course_level, sequence_position and file_type as filter fields to the index to pre-filter.`,
+        );
+        return await resources
+          .aggregate(
+            buildSearchPipeline(
+              vectorQuery,
+              vectorFilters,
+              context,
+              limit,
+              numCandidates,
+              false,
+            ),
+          )
+          .toArray();
+      }
     } catch (error) {
       const errorMessage =
         error instanceof Error ? error.message : String(error);
@@ -453,7 +820,7 @@ export async function getAllResources(
       .limit(limit)
       .project({
         title: 1,
-        content: 1,
+        content_sample: 1,
         url: 1,
         language: 1,
         course_level: 1,
@@ -478,13 +845,25 @@ export async function getAllResources(
   }
 }
 
-export async function getResourceByDriveId(driveId: string) {
+/**
+ * Looks up a resource by its Drive file ID
+ * @param driveId The Drive file ID of the resource
+ * @param projection Optional projection, e.g. to skip the content and embedding
+ * when only checking whether the resource exists
+ */
+export async function getResourceByDriveId(
+  driveId: string,
+  projection?: mongoDb.Document,
+) {
   console.log(`Looking up resource with drive_id: ${driveId}`);
   const db = await connectToDatabase();
   const resources = db.collection("resources");
   try {
     // Look up by drive_id field, not by _id
-    const resource = await resources.findOne({ drive_id: driveId });
+    const resource = await resources.findOne(
+      { drive_id: driveId },
+      { projection },
+    );
     if (resource) {
       console.log(`Found resource with drive_id ${driveId}`);
     } else {
@@ -596,21 +975,20 @@ export async function getUniqueFieldValues(field: string): Promise<string[]> {
 }
 
 /**
- * Saves a resource to MongoDB
+ * Builds the MongoDB document for a resource without writing it
  * @param url The URL of the resource
  * @param content The content of the resource
  * @param info The extracted info from the resource
+ * @returns The resource document, or null if the content cannot be stored
  */
-export async function saveToMongoDB(
+export function buildResourceDocument(
   url: string,
   content: FileContent,
   info: FileInfo,
-) {
-  const db = await connectToDatabase();
-  const resources = db.collection("resources");
+): ResourceDocument | null {
   if (!content) {
     console.log(`Failed to save ${url} to MongoDB: Content is null`);
-    return;
+    return null;
   }
 
   const fileType = info.file_type || getFileExtension(url);
@@ -634,13 +1012,11 @@ export async function saveToMongoDB(
       };
     }
   } else if (fileType === "notebook" || fileType === "ipynb") {
+    // The Drive downloader already parses valid notebooks, so a string here
+    // is content that failed to parse; keep it as text rather than retrying
     if (typeof content === "string") {
-      try {
-        processedContent = JSON.parse(content);
-      } catch (e) {
-        console.log(`Content for ${url} is not a valid notebook format`, e);
-        processedContent = { text: content as string };
-      }
+      console.log(`Content for ${url} is not a valid notebook format`);
+      processedContent = { text: content };
     }
   } else if (typeof content === "string") {
     processedContent = content;
@@ -653,11 +1029,11 @@ export async function saveToMongoDB(
       processedContent = JSON.stringify(content);
     } catch (e) {
       console.log(`Failed to stringify content for ${url}`, e);
-      return;
+      return null;
     }
   }
 
-  const resource: ResourceDocument = {
+  return {
     url,
     content: processedContent,
     title: info.title,
@@ -677,90 +1053,220 @@ export async function saveToMongoDB(
     metadata_processed: true,
     date_saved: new Date(),
   };
+}
+
+/**
+ * Saves a batch of resources to MongoDB in a single bulk write.
+ * Resources are upserted by URL so re-running a batch never creates duplicates.
+ * @param batch The resource documents to save
+ */
+export async function saveResourcesToMongoDB(batch: ResourceDocument[]) {
+  if (batch.length === 0) {
+    return;
+  }
+
+  const db = await connectToDatabase();
+  const resources = db.collection("resources", {
+    writeConcern: ingestWriteConcern,
+  });
+
+  const result = await resources.bulkWrite(
+    batch.map((resource) => ({
+      updateOne: {
+        filter: { url: resource.url },
+        update: { $setOnInsert: resource },
+        upsert: true,
+      },
+    })),
+    { ordered: false },
+  );
 
-  await resources.insertOne(resource);
   console.log(
-    `Saved ${url} to MongoDB as ${resource.file_type || "unknown type"} by ${resource.author || "unknown author"} from ${resource.university || "unknown university"}`,
+    `Saved batch of ${batch.length} resources to MongoDB, inserted: ${result.upsertedCount}, already present: ${result.matchedCount}`,
   );
 }
 
-export async function exportResourcesFromMongoDB(
-  output_dir = "downloaded_resources",
-) {
-  const db = await connectToDatabase();
-  const resources = db.collection("resources");
+// File types whose export extension differs from the stored type
+const EXPORT_EXTENSIONS: Record<string, string> = {
+  notebook: "ipynb",
+  javascript: "js",
+  typescript: "ts",
+  python: "py",
+};
+
+// URL shapes used to derive export filenames, compiled once
+const COLAB_URL_PATTERN = /colab\.research\.google\.com\/drive\/([^/?#]+)/;
+const GITHUB_URL_PATTERN = /github\.com\/([^/]+)\/([^/?#]+)(?:.*\/([^/?#]+))?/;
+const DRIVE_URL_PATTERN = /drive\.google\.com\/.*?([-\w]{25,})/;
 
-  if (!fs.existsSync(output_dir)) {
-    fs.mkdirSync(output_dir);
-    console.log(`Created output directory: ${output_dir}`);
+/**
+ * Derives a collision-free export filename for a resource from its URL
+ * @param resource The resource document to name
+ * @param index Position of the resource in the export, used for fallback names
+ * @returns The filename to export the resource as
+ */
+function exportFilename(resource: mongoDb.Document, index: number): string {
+  const url: string = resource.url;
+  const fileType: string = resource.file_type || "";
+  const extension = EXPORT_EXTENSIONS[fileType] || fileType;
+  let filename = "";
+
+  let match: RegExpMatchArray | null;
+  if ((match = url.match(COLAB_URL_PATTERN))) {
+    filename = `colab_${match[1]}`;
+  } else if ((match = url.match(GITHUB_URL_PATTERN))) {
+    const [, owner, repo, file] = match;
+    filename = `github_${owner}_${repo}_${file ?? repo}`;
+  } else if ((match = url.match(DRIVE_URL_PATTERN))) {
+    filename = `drive_${match[1]}`;
+  } else {
+    filename = `resource_${index}`;
   }
 
-  const all_resources = await resources.find({}).toArray();
-  let count = 0;
+  if (extension && !filename.endsWith(`.${extension}`)) {
+    filename += `.${extension}`;
+  } else if (!filename.includes(".")) {
+    filename += ".txt";
+  }
 
-  for (const resource of all_resources) {
-    try {
-      const url = resource.url;
-      let filename = "";
-      let extension = resource.file_type || "";
-
-      if (extension === "notebook") {
-        extension = "ipynb";
-      } else if (extension === "javascript") {
-        extension = "js";
-      } else if (extension === "typescript") {
-        extension = "ts";
-      } else if (extension === "python") {
-        extension = "py";
-      }
+  // Suffix a short hash of the URL so notebooks that share a basename
+  // (e.g. the same file name in different folders) never overwrite each other
+  const urlHash = createHash("sha256").update(url).digest("hex").slice(0, 12);
+  const { name, ext } = path.parse(filename);
+  return `${name}_${urlHash}${ext}`;
+}
 
-      if (url.includes("colab.research.google.com")) {
-        const file_id = url.split("/").pop() || "";
-        filename = `colab_${file_id}`;
-      } else if (url.includes("github.com")) {
-        const parts = url.replace("https://github.com/", "").split("/");
-        const repo = parts.slice(0, 2).join("_");
-        filename = `github_${repo}_${parts[parts.length - 1]}`;
-        if (filename.includes("blob")) {
-          filename = filename.replace("blob_", "");
-        }
-      } else if (url.includes("drive.google.com")) {
-        const file_id = url.match(/[-\w]{25,}/) || ["unknown"];
-        filename = `drive_${file_id[0]}`;
-      } else {
-        filename = `resource_${count}`;
-      }
+/**
+ * Serializes a resource's stored content for export
+ * Binary data is returned as raw bytes rather than round-tripping
+ * through a string or JSON encoding
+ * @param content The stored content of the resource
+ * @returns The text or bytes to export
+ */
+function exportFileContent(content: unknown): string | Uint8Array {
+  if (typeof content === "string") {
+    return content;
+  } else if (content instanceof mongoDb.Binary) {
+    return content.buffer;
+  } else if (
+    content &&
+    typeof content === "object" &&
+    "data" in content &&
+    content.data instanceof mongoDb.Binary
+  ) {
+    return content.data.buffer;
+  }
+  // One-space indentation is what Jupyter itself writes for .ipynb files
+  return JSON.stringify(content, null, 1);
+}
 
-      if (extension && !filename.endsWith(`.${extension}`)) {
-        filename += `.${extension}`;
-      } else if (!filename.includes(".")) {
-        filename += ".txt";
-      }
+/**
+ * Writes a single resource to the export directory
+ * @param resource The resource document to export
+ * @param index Position of the resource in the export, used for fallback names
+ * @param output_dir The directory to write the file to
+ * @returns The exported filename, or null if the export failed
+ */
+async function exportResource(
+  resource: mongoDb.Document,
+  index: number,
+  output_dir: string,
+): Promise<string | null> {
+  try {
+    const filename = exportFilename(resource, index);
+    const filepath = path.join(output_dir, filename);
 
-      const filepath = path.join(output_dir, filename);
+    await fs.promises.writeFile(filepath, exportFileContent(resource.content));
 
-      let fileContent: string;
+    console.log(`Exported: ${filepath}`);
+    return filename;
+  } catch (e) {
+    console.error(
+      `Error exporting resource ${index}: ${e instanceof Error ? e.message : String(e)}`,
+    );
+    return null;
+  }
+}
 
-      if (typeof resource.content === "string") {
-        fileContent = resource.content;
-      } else if (Buffer.isBuffer(resource.content)) {
-        fileContent = resource.content.toString("utf-8");
-      } else {
-        fileContent = JSON.stringify(resource.content, null, 2);
+export async function exportResourcesFromMongoDB(
+  output_dir = "downloaded_resources",
+) {
+  const db = await connectToDatabase();
+  const resources = db.collection("resources");
+
+  await fs.promises.mkdir(output_dir, { recursive: true });
+
+  // Stream only the fields the export needs, in modest batches, instead of
+  // loading every full document into memory at once
+  const cursor = resources
+    .find({}, { projection: { _id: 0, url: 1, file_type: 1, content: 1 } })
+    .batchSize(EXPORT_BATCH_SIZE);
+  const manifest: string[] = [];
+
+  // Write files concurrently so encoding and disk I/O overlap
+  await forEachWithConcurrency(
+    cursor,
+    EXPORT_CONCURRENCY,
+    async (resource, index) => {
+      const filename = await exportResource(resource, index, output_dir);
+      if (filename) {
+        manifest.push(JSON.stringify({ file: filename, url: resource.url }));
       }
+    },
+  );
 
-      fs.writeFileSync(filepath, fileContent, { encoding: "utf-8" });
+  // Map every exported file back to its source URL, written in one go
+  await fs.promises.writeFile(
+    path.join(output_dir, "manifest.jsonl"),
+    manifest.length > 0 ? manifest.join("\n") + "\n" : "",
+  );
 
-      console.log(`Exported: ${filepath}`);
+  console.log(
+    `Exported ${manifest.length} resources to ${output_dir} directory`,
+  );
+}
+
+/**
+ * Exports every resource into a single gzip-compressed JSON Lines archive
+ * instead of one file per resource. Each line holds the exported filename,
+ * source URL and content; binary content is base64-encoded.
+ * Uses the fastest gzip level; notebook JSON compresses well even so
+ * @param archive_path Path of the archive to write
+ */
+export async function exportResourcesToArchive(
+  archive_path = "downloaded_resources.jsonl.gz",
+) {
+  const db = await connectToDatabase();
+  const resources = db.collection("resources");
+
+  const cursor = resources
+    .find({}, { projection: { _id: 0, url: 1, file_type: 1, content: 1 } })
+    .batchSize(EXPORT_BATCH_SIZE);
+
+  let count = 0;
+  async function* archiveLines() {
+    for await (const resource of cursor) {
+      const content = exportFileContent(resource.content);
+      const binary = typeof content !== "string";
+      const record = {
+        file: exportFilename(resource, count),
+        url: resource.url,
+        content: binary ? Buffer.from(content).toString("base64") : content,
+        ...(binary ? { encoding: "base64" } : {}),
+      };
       count++;
-    } catch (e) {
-      console.error(
-        `Error exporting resource ${count}: ${e instanceof Error ? e.message : String(e)}`,
-      );
+      yield `${JSON.stringify(record)}\n`;
     }
   }
 
-  console.log(`Exported ${count} resources to ${output_dir} directory`);
+  // Stream lines through gzip to disk so the archive is never held in memory
+  await pipeline(
+    Readable.from(archiveLines()),
+    zlib.createGzip({ level: 1 }),
+    fs.createWriteStream(archive_path),
+  );
+
+  console.log(`Exported ${count} resources to ${archive_path}`);
 }
 
 process.on("exit", closeDatabaseConnection);
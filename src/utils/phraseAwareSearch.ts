@@ -6,6 +6,11 @@
  * and vector search operations.
  */
 
+// Matches phrases within double quotes, accounting for escaped quotes
+const PHRASE_PATTERN = /"([^"\\]*(\\.[^"\\]*)*)"/g;
+const ESCAPED_QUOTE_PATTERN = /\\"/g;
+const WHITESPACE_PATTERN = /\s+/g;
+
 /**
  * Parses a search query to extract quoted phrases
  * @param rawQuery The user's raw search query
@@ -21,17 +26,14 @@ export function parseSearchQuery(rawQuery: string): {
 
   const extractedPhrases: string[] = [];
 
-  // Regex to match phrases within double quotes, accounting for escaped quotes
-  const phraseRegex = /"([^"\\]*(\\.[^"\\]*)*)"/g;
-
   // Replace quoted phrases with placeholder tokens and collect phrases
-  const processedQuery = rawQuery.replace(phraseRegex, (match, phrase) => {
-    // Extract the phrase without quotes
-    const cleanPhrase = phrase.replace(/\\"/g, '"'); // Handle escaped quotes
+  const processedQuery = rawQuery.replace(PHRASE_PATTERN, (match, phrase) => {
+    // Extract the phrase without quotes, unescaping any escaped quotes
+    const cleanPhrase = phrase.replace(ESCAPED_QUOTE_PATTERN, '"');
     extractedPhrases.push(cleanPhrase);
 
     // Replace with underscore-joined version to preserve as single concept
-    return cleanPhrase.replace(/\s+/g, "_");
+    return cleanPhrase.replace(WHITESPACE_PATTERN, "_");
   });
 
   return { processedQuery, extractedPhrases };
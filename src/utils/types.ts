@@ -22,6 +22,12 @@ export type ResourceDocument = {
   drive_id?: string;
 };
 
+export type ResourceUpdate = {
+  driveId: string;
+  content: FileContent;
+  info: FileInfo;
+};
+
 export type FileContent =
   | NotebookContent
   | TextContent
@@ -0,0 +1,209 @@
+/**
+ * In-memory vector search over a copy of the resource embeddings
+ *
+ * For a corpus of a few thousand resources, a brute-force scan over
+ * normalized vectors held in process memory answers a query faster than a
+ * round-trip to Atlas Vector Search, and ranks resources the same way.
+ * Vectors are stored quantized to int8 with a per-vector scale, a quarter of
+ * the memory of float32, which costs almost nothing in ranking accuracy.
+ */
+
+export type CachedResource = Record<string, unknown>;
+
+export type VectorIndex = {
+  dimensions: number;
+  // Row-major, one L2-normalized vector per resource, quantized to int8
+  vectors: Int8Array;
+  // Multiplier that turns each quantized row back into its float values
+  scales: Float32Array;
+  // Resource metadata, in the same order as the vectors
+  resources: CachedResource[];
+};
+
+/**
+ * Returns an L2-normalized float32 copy of a vector
+ * @param vector The vector to normalize
+ * @returns The normalized vector, or null if it has no magnitude
+ */
+function normalize(vector: ArrayLike<number>): Float32Array | null {
+  let sumOfSquares = 0;
+  for (let i = 0; i < vector.length; i++) {
+    sumOfSquares += vector[i] * vector[i];
+  }
+  if (sumOfSquares === 0) {
+    return null;
+  }
+
+  const norm = Math.sqrt(sumOfSquares);
+  const normalized = new Float32Array(vector.length);
+  for (let i = 0; i < vector.length; i++) {
+    normalized[i] = vector[i] / norm;
+  }
+  return normalized;
+}
+
+/**
+ * Builds an index from resources and their embeddings. Entries whose
+ * embedding is empty or has a different dimension than the first are skipped
+ * @param entries The embedding and metadata of each resource
+ * @returns The vector index
+ */
+export function buildVectorIndex(
+  entries: { embedding: number[]; resource: CachedResource }[],
+): VectorIndex {
+  const first = entries.find(({ embedding }) => embedding.length > 0);
+  const dimensions = first ? first.embedding.length : 0;
+  if (dimensions === 0) {
+    return {
+      dimensions: 0,
+      vectors: new Int8Array(0),
+      scales: new Float32Array(0),
+      resources: [],
+    };
+  }
+
+  const rows: Float32Array[] = [];
+  const resources: CachedResource[] = [];
+  for (const { embedding, resource } of entries) {
+    if (embedding.length !== dimensions) {
+      continue;
+    }
+    const row = normalize(embedding);
+    if (row) {
+      rows.push(row);
+      resources.push(resource);
+    }
+  }
+
+  // Pack the quantized rows into one contiguous buffer so the scan reads
+  // memory in order. Each row is scaled so its largest component maps to 127
+  const vectors = new Int8Array(rows.length * dimensions);
+  const scales = new Float32Array(rows.length);
+  rows.forEach((row, i) => {
+    let maxAbs = 0;
+    for (let j = 0; j < dimensions; j++) {
+      maxAbs = Math.max(maxAbs, Math.abs(row[j]));
+    }
+    const scale = maxAbs / 127;
+    const offset = i * dimensions;
+    for (let j = 0; j < dimensions; j++) {
+      vectors[offset + j] = Math.round(row[j] / scale);
+    }
+    scales[i] = scale;
+  });
+
+  return { dimensions, vectors, scales, resources };
+}
+
+type Candidate = { index: number; similarity: number };
+
+/**
+ * Adds a candidate to a min-heap holding at most `capacity` candidates. Once
+ * full, a candidate only gets in by replacing the least similar one
+ * @param heap The heap, least similar candidate first
+ * @param candidate The candidate to add
+ * @param capacity Maximum number of candidates kept
+ */
+function pushBounded(
+  heap: Candidate[],
+  candidate: Candidate,
+  capacity: number,
+): void {
+  if (heap.length < capacity) {
+    heap.push(candidate);
+    let i = heap.length - 1;
+    while (i > 0) {
+      const parent = (i - 1) >> 1;
+      if (heap[parent].similarity <= heap[i].similarity) {
+        break;
+      }
+      [heap[parent], heap[i]] = [heap[i], heap[parent]];
+      i = parent;
+    }
+    return;
+  }
+
+  if (candidate.similarity <= heap[0].similarity) {
+    return;
+  }
+  heap[0] = candidate;
+  let i = 0;
+  while (true) {
+    const left = 2 * i + 1;
+    const right = left + 1;
+    let smallest = i;
+    if (
+      left < heap.length &&
+      heap[left].similarity < heap[smallest].similarity
+    ) {
+      smallest = left;
+    }
+    if (
+      right < heap.length &&
+      heap[right].similarity < heap[smallest].similarity
+    ) {
+      smallest = right;
+    }
+    if (smallest === i) {
+      break;
+    }
+    [heap[smallest], heap[i]] = [heap[i], heap[smallest]];
+    i = smallest;
+  }
+}
+
+/**
+ * Finds the resources most similar to a query vector
+ * @param index The vector index to search
+ * @param queryVector The embedding of the query
+ * @param limit Maximum number of results to return
+ * @param predicate Optional filter a resource has to pass to be returned
+ * @returns The matching resources with a `score`, best first. Scores use the
+ * same (1 + cosine) / 2 scale as Atlas Vector Search's cosine similarity
+ */
+export function searchVectorIndex(
+  index: VectorIndex,
+  queryVector: number[],
+  limit: number,
+  predicate?: (resource: CachedResource) => boolean,
+): CachedResource[] {
+  const { dimensions, vectors, scales, resources } = index;
+  if (resources.length === 0 || limit <= 0) {
+    return [];
+  }
+  if (queryVector.length !== dimensions) {
+    throw new Error(
+      `Query vector has ${queryVector.length} dimensions, but the cached embeddings have ${dimensions}`,
+    );
+  }
+
+  const query = normalize(queryVector);
+  if (!query) {
+    return [];
+  }
+
+  // Filter and score in one pass, so filtered-out rows are never scored, and
+  // keep only the best `limit` candidates instead of sorting every score
+  const best: Candidate[] = [];
+  for (let i = 0; i < resources.length; i++) {
+    if (predicate && !predicate(resources[i])) {
+      continue;
+    }
+
+    // Dot products of normalized vectors are their cosine similarities. The
+    // query stays in float32 and each row's scale is applied once per row
+    const offset = i * dimensions;
+    let dot = 0;
+    for (let j = 0; j < dimensions; j++) {
+      dot += vectors[offset + j] * query[j];
+    }
+    pushBounded(best, { index: i, similarity: dot * scales[i] }, limit);
+  }
+
+  return best
+    .sort((a, b) => b.similarity - a.similarity)
+    .map(({ index: i, similarity }) => ({
+      ...resources[i],
+      score: (1 + similarity) / 2,
+    }));
+}